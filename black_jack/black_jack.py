@@ -3,8 +3,10 @@
 
 import argparse
 import curses
+from array import array
 from copy import deepcopy
-from random import shuffle
+from random import Random, shuffle
+from sys import intern
 
 RULES = """Rules:
     Try to get as close to 21 without going over.
@@ -17,6 +19,7 @@ RULES = """Rules:
     but must hit exactly one more time before standing.
     In case of a tie, the bet is returned to the player.
     The dealer stops hitting at 17."""
+DEALER_STANDS = 17
 
 
 class Score():
@@ -62,12 +65,15 @@ class Deck():
 
     suits = ['♥', '♦', '♣', '♠']
     values = ['2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'D', 'K', 'A']
+    cards = None  # The 52 shared cards, created by the first deck
 
     def __init__(self):
         """Create deck."""
-        self.deck = [Card(value, suit)
-                     for value in self.values
-                     for suit in self.suits]
+        if Deck.cards is None:
+            Deck.cards = tuple(Card(value, suit)
+                               for value in self.values
+                               for suit in self.suits)
+        self.deck = list(Deck.cards)
 
     def get_card(self):
         """Get one card."""
@@ -78,33 +84,120 @@ class Deck():
         shuffle(self.deck)
 
 
+class Shoe():
+    """Shoe of several decks dealt up to the cut card.
+
+    Card indexes lie in one array allocated once and shuffled in place.
+    The cut card stands at penetration share of the shoe: when it is
+    reached, the shoe is shuffled before the next round. Penetration 0
+    shuffles before every round, as with a new deck. If the shoe runs out
+    in the middle of a round, only the discards of earlier rounds are
+    shuffled back, the cards on the table stay out. running_count is the
+    Hi-Lo count of the dealt cards.
+    """
+
+    def __init__(self, decks=1, penetration=0.0, rng=None):
+        """Create and shuffle shoe."""
+        self.decks = decks
+        self.faces = Deck().cards
+        self.cards = array('B', range(52))*decks
+        self.cut = int(len(self.cards)*penetration)
+        self.rng = rng or Random()
+        self.position = 0
+        self.round_start = 0
+        self.running_count = 0
+        self.shuffle()
+
+    def shuffle(self):
+        """Shuffle all cards back into shoe."""
+        self.rng.shuffle(self.cards)
+        self.position = 0
+        self.round_start = 0
+        self.running_count = 0
+
+    def shuffle_discards(self):
+        """Shuffle discards back, the cards of this round stay dealt.
+
+        Cards of the round move to the front of the shoe, the shuffled
+        discards follow them.
+        """
+        start = self.round_start
+        if not start:
+            raise IndexError('no discards to shuffle, the shoe is empty')
+        discards = self.cards[:start]
+        self.rng.shuffle(discards)
+        self.cards[:] = self.cards[start:] + discards
+        self.position = len(self.cards) - start
+        self.round_start = 0
+        self.running_count = sum(Card.hi_lo[index]
+                                 for index in self.cards[:self.position])
+
+    def new_round(self):
+        """Shuffle if the cut card was reached."""
+        if self.position >= self.cut:
+            self.shuffle()
+        self.round_start = self.position
+
+    def get_card(self):
+        """Get one card, shuffle discards back if the shoe is empty."""
+        if self.position == len(self.cards):
+            self.shuffle_discards()
+        index = self.cards[self.position]
+        self.position += 1
+        self.running_count += Card.hi_lo[index]
+        return self.faces[index]
+
+    def true_count(self):
+        """Running count per deck left in shoe."""
+        left = (len(self.cards) - self.position)/52
+        return self.running_count/left if left else 0.0
+
+
 class Card():
-    """Card for black jack."""
+    """Card for black jack.
+
+    Card is stored as index 0-51: rank*4 + suit in order of Deck.values
+    and Deck.suits. Points and open patterns are looked up by index in
+    tables built once, pattern lines are shared per rank and suit.
+    """
+
+    __slots__ = ('index',)
 
     red_suits = ['♥', '♦']
     black_suits = ['♣', '♠']
     number_values = ['2', '3', '4', '5', '6', '7', '8', '9', '10']
     ten_values = ['J', 'D', 'K']
     ace_values = ['A']
-    pattern_close = [
+    pattern_close = (
         '╔═══╗',
         '║╳╳╳║',
         '║╳╳╳║',
         '║╳╳╳║',
         '╚═══╝'
-    ]
+    )
+    rank_points = (2, 3, 4, 5, 6, 7, 8, 9, 10, 10, 10, 10, 11)  # By value
+    points = tuple(value for value in rank_points for suit in range(4))
+    rank_hi_lo = (1, 1, 1, 1, 1, 0, 0, 0, -1, -1, -1, -1, -1)
+    hi_lo = tuple(value for value in rank_hi_lo for suit in range(4))
+    patterns_open = tuple(
+        ('╔═══╗', intern('║' + value.ljust(3) + '║'), intern(f'║ {suit} ║'),
+         intern('║' + value.rjust(3) + '║'), '╚═══╝')
+        for value in Deck.values
+        for suit in Deck.suits)
 
     def __init__(self, value, suit):
         """Initiaization card."""
-        self.value = value
-        self.suit = suit
-        self.pattern_open = [
-            '╔═══╗',
-            '║' + f'{value}'.ljust(3) + '║',
-            f'║ {suit} ║',
-            '║' + f'{value}'.rjust(3) + '║',
-            '╚═══╝'
-        ]
+        self.index = Deck.values.index(value)*4 + Deck.suits.index(suit)
+
+    @property
+    def value(self):
+        """Return value of card: '2'-'10', 'J', 'D', 'K' or 'A'."""
+        return Deck.values[self.index >> 2]
+
+    @property
+    def suit(self):
+        """Return suit of card."""
+        return Deck.suits[self.index & 3]
 
     def get_close(self):
         """Return lines of close card."""
@@ -112,45 +205,54 @@ class Card():
 
     def get_open(self):
         """Return lines of open card."""
-        return self.pattern_open
+        return self.patterns_open[self.index]
 
 
 class Hands():
-    """Player for black jack."""
+    """Player for black jack.
+
+    Score is kept up to date in put_card: total counts aces as 11 while
+    that does not bust the hand, soft_aces is the number of such aces.
+    """
 
     def __init__(self, name):
         """Create player."""
         self.name = name
         self.cards = []
+        self.total = 0
+        self.soft_aces = 0
 
     def reset(self):
         """Reset cards."""
         self.cards = []
+        self.total = 0
+        self.soft_aces = 0
 
     def put_card(self, card):
         """Put card in hand."""
         self.cards.append(card)
+        points = Card.points[card.index]
+        self.total += points
+        if points == 11:
+            self.soft_aces += 1
+        while self.total > 21 and self.soft_aces > 0:
+            self.total -= 10
+            self.soft_aces -= 1
 
     def score(self):
         """Count score."""
-        score = 0
-        aces = 0
-        for card in self.cards:
-            if card.value in card.number_values:
-                score += int(card.value)
-            elif card.value in card.ten_values:
-                score += 10
-            elif card.value in card.ace_values:
-                score += 11
-                aces += 1
-        while score > 21 and aces > 0:
-            score -= 10
-            aces -= 1
-        return score
-
-
-def pr_field(stdscr, score, width, height, closed):
-    """Return string with field amount and bet."""
+        return self.total
+
+    def soft(self):
+        """Return True if an ace is counted as 11 in score."""
+        return self.soft_aces > 0
+
+
+def pr_field(stdscr, score, width, height, closed, footer=None):
+    """Return string with field amount and bet.
+
+    footer - text of the bottom line instead of the list of keys.
+    """
     amount = score.amount
     bet = score.bet
     bills = deepcopy(score.bills)
@@ -179,7 +281,8 @@ def pr_field(stdscr, score, width, height, closed):
 # Render Footer
     lines.append('┣' + '━'*(width-8) + '┻━━┷━━┫')
     lines.append(
-        '┃' + '(H)it (S)tand (D)ouble (Q)uit'.center(width - 2, ' ') + '┃')
+        '┃' + (footer or '(H)it (S)tand (D)ouble (Q)uit').center(
+            width - 2, ' ') + '┃')
     lines.append('┗' + '━'*(width - 2) + '┛')
     stdscr.addstr('\n'.join(lines), curses.color_pair(1))
 
@@ -210,11 +313,11 @@ def init_game(stdscr):
     y_diller = 3
     y_player = 8
 
-    def render(cards, score, closed=True):
+    def render(cards, score, closed=True, footer=None):
         """Drawing field and card."""
         nonlocal stdscr, width, height, x_start, x_delta, y_diller, y_player
         stdscr.clear()
-        pr_field(stdscr, score, width, height, closed)
+        pr_field(stdscr, score, width, height, closed, footer)
         pr_card(stdscr, cards['diller'][0], y_diller, x_start, closed)
         count = 1
         for card in cards['diller'][1:]:
@@ -257,20 +360,24 @@ def pr_result(stdscr, result):
     stdscr.addstr(2, 22, '╚═════╝', curses.color_pair(2))
 
 
-def game(stdscr, amount, bet):
-    """Game in Black Jack with start amount."""
+def game(stdscr, amount, bet, decks=1, penetration=0.0, advice=None):
+    """Game in Black Jack with start amount.
+
+    advice(total, soft, upcard, first) - footer with a hint for the
+    player's hand (see strategy.advisor), None to show the keys only.
+    """
     render = init_game(stdscr)
 
     diller = Hands('diller')
     player = Hands('player')
     score = Score(amount, bet)
+    deck = Shoe(decks, penetration)
 
     game_live = True
     while game_live:
-        deck = Deck()
+        deck.new_round()
         score.move()
 
-        deck.shuflle()
         diller.reset()
         player.reset()
         diller.put_card(deck.get_card())
@@ -281,7 +388,15 @@ def game(stdscr, amount, bet):
         score.add_bill([diller.score(), player.score()])
         cards = {'diller': diller.cards, 'player': player.cards}
 
-        render(cards, score)
+        def hint():
+            """Footer with advice for the player's hand."""
+            if advice is None or player.score() > 21:
+                return None
+            return advice(player.score(), player.soft(),
+                          Card.points[diller.cards[1].index],
+                          len(player.cards) == 2)
+
+        render(cards, score, footer=hint())
         while game_live:
             key = stdscr.getkey()
             if key.upper() == 'Q':
@@ -297,11 +412,12 @@ def game(stdscr, amount, bet):
                 score.refresh_bills([diller.score(), player.score()])
             else:
                 continue
-            render(cards, score)
+            render(cards, score, footer=hint())
             if player.score() > 21:
                 break
         render(cards, score, False)
-        while game_live and diller.score() < 17 and player.score() <= 21:
+        while (game_live and diller.score() < DEALER_STANDS and
+               player.score() <= 21):
             diller.put_card(deck.get_card())
             score.refresh_bills([diller.score(), player.score()])
             render(cards, score, False)
@@ -325,13 +441,27 @@ def create_parser():
                         help='Your start amount.')
     parser.add_argument('-b', '--bet', default=100, type=int,
                         help='bet in game.')
+    parser.add_argument('-d', '--decks', default=1, type=int,
+                        help='decks in shoe.')
+    parser.add_argument('-p', '--penetration', default=0.0, type=float,
+                        help='share of shoe dealt before shuffle '
+                        '(0 - shuffle every round).')
+    parser.add_argument('-e', '--ev', action='store_true',
+                        help='show expected value of each action.')
     return parser
 
 
 if __name__ == '__main__':
     bj_parser = create_parser()
     bj_args = bj_parser.parse_args()
+    if bj_args.decks < 1 or not 0 <= bj_args.penetration < 1:
+        bj_parser.error('need at least one deck and penetration in [0, 1)')
     if bj_args.rules:
         print(RULES)
     else:
-        curses.wrapper(game, bj_args.amount, bj_args.bet)
+        bj_advice = None
+        if bj_args.ev:
+            from strategy import advisor, load_tables
+            bj_advice = advisor(load_tables(bj_args.decks, report=print))
+        curses.wrapper(game, bj_args.amount, bj_args.bet, bj_args.decks,
+                       bj_args.penetration, bj_advice)
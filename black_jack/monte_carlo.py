@@ -0,0 +1,618 @@
+"""Headless Monte Carlo simulation of black jack.
+
+Hands are played by the rules of game() in black_jack.py: cards come
+from a Shoe (by default one deck shuffled every round), two cards to the
+dealer (the first one is closed) and two to the player, the player hits,
+stands or doubles until standing or busting, the dealer hits below
+DEALER_STANDS, check_win decides and Score.referee pays.
+
+The player follows a strategy: a function
+strategy(total, soft, upcard, first) -> 'H', 'S' or 'D', where total is
+the player's score, soft - an ace is counted as 11, upcard - value of the
+dealer's open card (2-11) and first - no action was taken yet.
+
+Two engines play the same rules: 'python' uses Deck, Hands, check_win and
+Score.referee directly, 'numpy' compiles the strategy into a table and
+deals and plays a whole chunk of hands with array operations.
+"""
+import argparse
+import json
+from collections import Counter
+from multiprocessing import Pool
+from random import Random
+from time import perf_counter
+
+from black_jack import DEALER_STANDS, Deck, Hands, Score, Shoe, check_win
+from strategy import basic_strategy, load_tables
+
+try:
+    import numpy as np
+except ImportError:  # Without NumPy only the python engine is available
+    np = None
+
+ACTIONS = 'SHD'  # Codes 0, 1, 2 in strategy tables
+CARDS = Deck().deck  # Card index 0-51 is the position in a new Deck
+
+
+def card_value(card):
+    """Value of card alone in hand, aces are 11."""
+    hand = Hands('card')
+    hand.put_card(card)
+    return hand.score()
+
+
+VALUES = [card_value(card) for card in CARDS]
+
+
+def dealer_like(total, soft, upcard, first):
+    """Play like the dealer: hit below 17."""
+    return 'H' if total < 17 else 'S'
+
+
+def cautious(total, soft, upcard, first):
+    """Never risk busting: hit only while no card can bust the hand."""
+    return 'H' if total < 12 or soft and total < 17 else 'S'
+
+
+def doubler(total, soft, upcard, first):
+    """Double on 10 and 11 against weak dealer cards, else like dealer."""
+    if first and total in (10, 11) and upcard < 10:
+        return 'D'
+    return dealer_like(total, soft, upcard, first)
+
+
+STRATEGIES = {
+    'dealer': dealer_like,
+    'cautious': cautious,
+    'doubler': doubler,
+}
+
+
+def get_strategy(name, decks=1):
+    """Strategy function by name.
+
+    'basic' plays by the basic strategy tables of strategy.py for a shoe
+    of decks, the other names are the fixed STRATEGIES.
+    """
+    if name == 'basic':
+        return basic_strategy(load_tables(decks))
+    return STRATEGIES[name]
+
+
+def flat(bets, multiples, default_bet):
+    """Betting: always the default bet."""
+    return default_bet
+
+
+def martingale(bets, multiples, default_bet):
+    """Betting: double the bet after a loss, back to default after a win."""
+    if np is not None and hasattr(bets, 'shape'):
+        return np.where(multiples < 0, 2*bets,
+                        np.where(multiples > 0, default_bet, bets))
+    return 2*bets if multiples < 0 else default_bet if multiples > 0 else bets
+
+
+BETTINGS = {'flat': flat, 'martingale': martingale}
+
+
+def play_reference(order, strategy):
+    """Play one hand with objects from black_jack.
+
+    order - card indexes in dealing order. Return result of check_win and
+    the change of amount in bets.
+    """
+    deck = Deck()
+    deck.deck = [CARDS[index] for index in reversed(order)]
+    return play_hand(deck, strategy)
+
+
+def play_hand(deck, strategy):
+    """Play one hand from deck (Deck or Shoe) like game() does.
+
+    Return result of check_win and the change of amount in bets.
+    """
+    diller = Hands('diller')
+    player = Hands('player')
+    score = Score(0, 1)
+    score.move()
+    diller.put_card(deck.get_card())
+    diller.put_card(deck.get_card())
+    player.put_card(deck.get_card())
+    player.put_card(deck.get_card())
+    upcard = card_value(diller.cards[1])
+    first = True
+    while True:
+        action = strategy(player.score(), player.soft(), upcard, first)
+        first = False
+        if action == 'S':
+            break
+        if action == 'D':
+            score.double()
+        player.put_card(deck.get_card())
+        if player.score() > 21:
+            break
+    while diller.score() < DEALER_STANDS and player.score() <= 21:
+        diller.put_card(deck.get_card())
+    result = check_win(player, diller)
+    score.referee(result)
+    return result, score.amount
+
+
+def simulate_python(hands, strategy, seed=0, decks=1, penetration=0.0,
+                    counts=None):
+    """Change of amount in bets for each of hands, played with objects.
+
+    Hands are dealt from one Shoe; if counts is a list, the true count
+    before every hand is appended to it.
+    """
+    shoe = Shoe(decks, penetration, Random(seed))
+    multiples = []
+    for _ in range(hands):
+        shoe.new_round()
+        if counts is not None:
+            counts.append(shoe.true_count())
+        multiples.append(play_hand(shoe, strategy)[1])
+    return multiples
+
+
+def strategy_table(strategy):
+    """Strategy as array [first, soft, total, upcard] of action codes."""
+    table = np.zeros((2, 2, 22, 12), dtype=np.int8)
+    for first in (0, 1):
+        for soft in (0, 1):
+            for total in range(4, 22):
+                for upcard in range(2, 12):
+                    table[first, soft, total, upcard] = ACTIONS.index(
+                        strategy(total, bool(soft), upcard, bool(first)))
+    return table
+
+
+class _Hands:
+    """Totals and soft aces of one hand in each row of a chunk."""
+
+    def __init__(self, count):
+        self.total = np.zeros(count, dtype=np.int16)
+        self.soft = np.zeros(count, dtype=np.int8)
+
+    def add(self, rows, values):
+        """Add card values to hands in rows, counting aces as in score."""
+        total = self.total[rows] + values
+        soft = self.soft[rows] + (values == 11)
+        for _ in range(2):  # An ace added to a soft 21 needs two steps
+            over = (total > 21) & (soft > 0)
+            total -= 10*over
+            soft -= over
+        self.total[rows] = total
+        self.soft[rows] = soft
+
+
+def play_decks(decks, table, rng=None):
+    """Play one hand per row of decks, return change of amount in bets.
+
+    decks - array (hands, cards in shoe) of card indexes 0-51 in dealing
+    order. With rng the rows are shuffled lazily: a card position is
+    drawn (one step of Fisher-Yates) only when a hand needs that card, so
+    rows may start unshuffled.
+    """
+    count, size = decks.shape
+    values = np.array(VALUES, dtype=np.int16)
+    position = np.zeros(count, dtype=np.intp)
+    everyone = np.arange(count)
+
+    def draw(rows):
+        place = position[rows]
+        if rng is not None:
+            other = place + rng.integers(0, size - place)
+            decks[rows, place], decks[rows, other] = (
+                decks[rows, other], decks[rows, place])
+        position[rows] = place + 1
+        return values[decks[rows, place]]
+
+    diller = _Hands(count)
+    player = _Hands(count)
+    diller.add(everyone, draw(everyone))
+    upcard = draw(everyone)
+    diller.add(everyone, upcard)
+    player.add(everyone, draw(everyone))
+    player.add(everyone, draw(everyone))
+
+    bets = np.ones(count, dtype=np.int64)
+    rows = everyone
+    first = 1
+    while len(rows):
+        actions = table[first, (player.soft[rows] > 0).astype(np.intp),
+                        player.total[rows], upcard[rows]]
+        first = 0
+        rows = rows[actions != 0]
+        bets[rows[actions[actions != 0] == 2]] *= 2
+        player.add(rows, draw(rows))
+        rows = rows[player.total[rows] <= 21]
+
+    rows = everyone[player.total <= 21]
+    while len(rows):
+        rows = rows[diller.total[rows] < DEALER_STANDS]
+        diller.add(rows, draw(rows))
+
+    # check_win and Score.referee: bust or lower score loses the bet
+    won = (player.total <= 21) & (
+        (diller.total > 21) | (player.total > diller.total))
+    lost = (player.total > 21) | (
+        (diller.total <= 21) & (player.total < diller.total))
+    return bets*won - bets*lost
+
+
+def simulate_numpy(hands, strategy, seed=0, decks=1, penetration=0.0,
+                   chunk=1 << 17):
+    """Change of amount in bets for each of hands, played with NumPy.
+
+    seed - number, numpy SeedSequence or Generator. Every hand gets a
+    freshly shuffled shoe of decks, so only penetration 0 is supported.
+    """
+    if penetration:
+        raise ValueError('numpy engine shuffles every hand, '
+                         'use penetration 0')
+    rng = np.random.default_rng(seed)
+    table = strategy_table(strategy)
+    deck = np.tile(np.arange(52, dtype=np.int8), decks)
+    multiples = np.empty(hands, dtype=np.int64)
+    for start in range(0, hands, chunk):
+        count = min(chunk, hands - start)
+        decks = np.tile(deck, (count, 1))
+        multiples[start:start+count] = play_decks(decks, table, rng)
+    return multiples
+
+
+ENGINES = {'python': simulate_python}
+if np is not None:
+    ENGINES['numpy'] = simulate_numpy
+DEFAULT_ENGINE = 'numpy' if np is not None else 'python'
+
+
+def bankroll(multiples, sessions, amount, bet, betting=flat):
+    """Amount after each hand of each session.
+
+    Hands are split into sessions in order. The outcome of a hand does
+    not depend on the bet, so betting(bets, multiples, default_bet) sets
+    the next bets from the previous ones after the hands are played.
+    """
+    if np is None:
+        length = len(multiples)//sessions
+        curves = []
+        for session in range(sessions):
+            current, bets, last = amount, bet, 0
+            curve = []
+            for multiple in multiples[session*length:(session+1)*length]:
+                bets = betting(bets, last, bet) if curve else bet
+                current += bets*multiple
+                last = multiple
+                curve.append(current)
+            curves.append(curve)
+        return curves
+    length = len(multiples)//sessions
+    outcomes = np.asarray(multiples[:sessions*length]).reshape(
+        sessions, length)
+    if betting is flat:
+        return amount + bet*np.cumsum(outcomes, axis=1)
+    bets = np.empty(outcomes.shape, dtype=np.int64)
+    bets[:, 0] = bet
+    for hand in range(1, length):
+        bets[:, hand] = betting(bets[:, hand-1], outcomes[:, hand-1], bet)
+    return amount + np.cumsum(bets*outcomes, axis=1)
+
+
+def summarize(multiples):
+    """House edge and variance per initial bet, share of results."""
+    count = len(multiples)
+    mean = sum(multiples)/count
+    variance = sum((value - mean)**2 for value in multiples)/count
+    return {
+        'hands': count,
+        'house_edge': -mean,
+        'variance': variance,
+        'std': variance**0.5,
+        'win': sum(1 for value in multiples if value > 0)/count,
+        'tie': sum(1 for value in multiples if value == 0)/count,
+        'lose': sum(1 for value in multiples if value < 0)/count,
+    }
+
+
+def summarize_array(multiples):
+    """summarize for NumPy arrays."""
+    count = len(multiples)
+    return {
+        'hands': count,
+        'house_edge': -float(multiples.mean()),
+        'variance': float(multiples.var()),
+        'std': float(multiples.std()),
+        'win': float((multiples > 0).mean()),
+        'tie': float((multiples == 0).mean()),
+        'lose': float((multiples < 0).mean()),
+    }
+
+
+def curve_quantiles(curves, points=10):
+    """Percentiles 5, 50 and 95 of amount across sessions at points hands."""
+    length = len(curves[0])
+    marks = sorted({max(1, length*step//points)
+                    for step in range(1, points+1)})
+    rows = []
+    for mark in marks:
+        amounts = sorted(curve[mark-1] for curve in curves)
+        rows.append({
+            'hand': mark,
+            'p5': amounts[int(0.05*(len(amounts)-1))],
+            'p50': amounts[int(0.5*(len(amounts)-1))],
+            'p95': amounts[int(0.95*(len(amounts)-1))],
+        })
+    return rows
+
+
+def run(hands, strategy='dealer', engine=DEFAULT_ENGINE, seed=0,
+        sessions=100, amount=1000, bet=100, betting='flat', decks=1,
+        penetration=0.0):
+    """Simulate hands, return statistics and bankroll percentiles."""
+    player = get_strategy(strategy, decks)
+    start = perf_counter()
+    multiples = ENGINES[engine](hands, player, seed, decks, penetration)
+    seconds = perf_counter() - start
+    stats = (summarize_array(multiples) if engine == 'numpy'
+             else summarize(multiples))
+    stats.update(strategy=strategy, engine=engine, seed=seed, decks=decks,
+                 penetration=penetration, seconds=seconds,
+                 hands_per_sec=hands/seconds if seconds else float('inf'))
+    sessions = max(1, min(sessions, hands))
+    curves = bankroll(multiples, sessions, amount, bet, BETTINGS[betting])
+    stats.update(sessions=sessions, amount=amount, bet=bet, betting=betting,
+                 bankroll=curve_quantiles(
+                     curves.tolist() if hasattr(curves, 'tolist')
+                     else curves))
+    return stats
+
+
+def format_stats(stats):
+    """Lines with statistics of run."""
+    lines = [
+        f"{stats['engine']} engine, {stats['strategy']} strategy: "
+        f"{stats['hands']} hands in {stats['seconds']:.3f}s "
+        f"({stats['hands_per_sec']:.0f} hands/s)",
+        f"house edge {100*stats['house_edge']:.3f}%, "
+        f"variance {stats['variance']:.4f}, std {stats['std']:.4f}, "
+        f"win {100*stats['win']:.2f}% tie {100*stats['tie']:.2f}% "
+        f"lose {100*stats['lose']:.2f}%",
+        f"bankroll of {stats['sessions']} sessions, amount {stats['amount']}, "
+        f"{stats['betting']} bet {stats['bet']} (p5 / p50 / p95):",
+    ]
+    lines.extend(f"  after {row['hand']:>8} hands: "
+                 f"{row['p5']:>10} {row['p50']:>10} {row['p95']:>10}"
+                 for row in stats['bankroll'])
+    return '\n'.join(lines)
+
+
+class RunningStats():
+    """Mergeable statistics of hand outcomes and session results.
+
+    Mean and variance are merged by Chan's formula. Outcomes of hands and
+    session results are multiples of the bet, so exact counters of values
+    serve as mergeable sketches for shares and percentiles.
+    """
+
+    def __init__(self):
+        """Create empty statistics."""
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.outcomes = Counter()
+        self.finals = Counter()
+
+    def merge(self, other):
+        """Add statistics collected elsewhere."""
+        count = self.count + other.count
+        if count:
+            delta = other.mean - self.mean
+            self.mean += delta*other.count/count
+            self.m2 += other.m2 + delta*delta*self.count*other.count/count
+        self.count = count
+        self.outcomes.update(other.outcomes)
+        self.finals.update(other.finals)
+
+    def add(self, multiples, finals=()):
+        """Add outcomes of hands and final amounts of sessions."""
+        chunk = RunningStats()
+        chunk.count = len(multiples)
+        if chunk.count:
+            chunk.mean = float(np.mean(multiples))
+            chunk.m2 = float(np.sum((multiples - chunk.mean)**2))
+        values, counts = np.unique(multiples, return_counts=True)
+        chunk.outcomes.update(dict(zip(values.tolist(), counts.tolist())))
+        chunk.finals.update(np.asarray(finals).tolist())
+        self.merge(chunk)
+
+    def quantile(self, share):
+        """Final amount of session below which share of sessions lie."""
+        total = sum(self.finals.values())
+        seen = 0
+        for value in sorted(self.finals):
+            seen += self.finals[value]
+            if seen > share*(total - 1):
+                return value
+        return None
+
+    def summary(self):
+        """House edge, variance, shares of results and final percentiles."""
+        count = self.count or 1
+        variance = self.m2/count
+        return {
+            'hands': self.count,
+            'house_edge': -self.mean,
+            'variance': variance,
+            'std': variance**0.5,
+            'win': sum(number for value, number in self.outcomes.items()
+                       if value > 0)/count,
+            'tie': self.outcomes[0]/count,
+            'lose': sum(number for value, number in self.outcomes.items()
+                        if value < 0)/count,
+            'final_p5': self.quantile(0.05),
+            'final_p50': self.quantile(0.5),
+            'final_p95': self.quantile(0.95),
+        }
+
+
+def _shard(task):
+    """Play sessions of one worker, return only its RunningStats."""
+    sessions, length, strategy, seed, amount, bet, betting, decks = task
+    rng = np.random.default_rng(seed)
+    player = get_strategy(strategy, decks)
+    stats = RunningStats()
+    step = max(1, (1 << 17)//length)
+    for start in range(0, sessions, step):
+        count = min(step, sessions - start)
+        multiples = simulate_numpy(count*length, player, rng, decks)
+        curves = bankroll(multiples, count, amount, bet, BETTINGS[betting])
+        stats.add(multiples, curves[:, -1])
+    return stats
+
+
+def run_parallel(hands, strategy='dealer', workers=1, seed=0, sessions=100,
+                 amount=1000, bet=100, betting='flat', decks=1):
+    """Simulate hands in a pool of worker processes.
+
+    Sessions are split between workers in fixed shares and every worker
+    gets its own SeedSequence child stream, so for a given seed and number
+    of workers the result does not depend on scheduling.
+    """
+    sessions = max(1, min(sessions, hands))
+    length = hands//sessions
+    children = np.random.SeedSequence(seed).spawn(workers)
+    tasks = [(sessions//workers + (index < sessions % workers), length,
+              strategy, child, amount, bet, betting, decks)
+             for index, child in enumerate(children)]
+    tasks = [task for task in tasks if task[0]]
+    start = perf_counter()
+    if workers == 1:
+        shards = [_shard(task) for task in tasks]
+    else:
+        with Pool(workers) as pool:
+            shards = pool.map(_shard, tasks)
+    seconds = perf_counter() - start
+    total = RunningStats()
+    for shard in shards:
+        total.merge(shard)
+    stats = total.summary()
+    stats.update(strategy=strategy, engine='numpy', workers=workers,
+                 seed=seed, seconds=seconds,
+                 hands_per_sec=total.count/seconds if seconds else
+                 float('inf'),
+                 sessions=sessions, amount=amount, bet=bet, betting=betting,
+                 decks=decks)
+    return stats
+
+
+def format_parallel(stats):
+    """Lines with statistics of parallel run."""
+    return '\n'.join([
+        f"{stats['workers']} workers, {stats['strategy']} strategy: "
+        f"{stats['hands']} hands in {stats['seconds']:.3f}s "
+        f"({stats['hands_per_sec']:.0f} hands/s)",
+        f"house edge {100*stats['house_edge']:.3f}%, "
+        f"variance {stats['variance']:.4f}, std {stats['std']:.4f}, "
+        f"win {100*stats['win']:.2f}% tie {100*stats['tie']:.2f}% "
+        f"lose {100*stats['lose']:.2f}%",
+        f"final amount of {stats['sessions']} sessions, amount "
+        f"{stats['amount']}, {stats['betting']} bet {stats['bet']}: "
+        f"p5 {stats['final_p5']}, p50 {stats['final_p50']}, "
+        f"p95 {stats['final_p95']}",
+    ])
+
+
+def scaling(hands, workers, strategy='dealer', seed=0, sessions=100,
+            amount=1000, bet=100, betting='flat', decks=1):
+    """Speedup and efficiency of run_parallel by number of workers.
+
+    The baseline is a separately measured run with one worker.
+    """
+    def measure(count):
+        return run_parallel(hands, strategy, count, seed, sessions, amount,
+                            bet, betting, decks)
+
+    serial = measure(1)
+    for count in workers:
+        stats = serial if count == 1 else measure(count)
+        stats['speedup'] = serial['seconds']/stats['seconds']
+        stats['efficiency'] = stats['speedup']/count
+        yield stats
+
+
+def create_parser():
+    """Create parser for programm."""
+    parser = argparse.ArgumentParser(
+        description='Black Jack Monte Carlo simulation.',
+        epilog='@2022 Sany Thceren.'
+    )
+    parser.add_argument('-n', '--hands', default=1000000, type=int,
+                        help='hands to play.')
+    parser.add_argument('-s', '--strategy', default='dealer',
+                        choices=[*STRATEGIES, 'basic'],
+                        help='player strategy.')
+    parser.add_argument('-e', '--engine', default=DEFAULT_ENGINE,
+                        choices=ENGINES, help='simulation engine.')
+    parser.add_argument('--seed', default=0, type=int,
+                        help='random seed.')
+    parser.add_argument('--sessions', default=100, type=int,
+                        help='split hands into sessions for bankroll.')
+    parser.add_argument('-a', '--amount', default=1000, type=int,
+                        help='start amount of each session.')
+    parser.add_argument('-b', '--bet', default=100, type=int,
+                        help='default bet.')
+    parser.add_argument('--betting', default='flat', choices=BETTINGS,
+                        help='betting strategy.')
+    parser.add_argument('-d', '--decks', default=1, type=int,
+                        help='decks in shoe.')
+    parser.add_argument('-p', '--penetration', default=0.0, type=float,
+                        help='share of shoe dealt before shuffle '
+                        '(python engine only).')
+    parser.add_argument('-j', '--workers', default=0, type=int,
+                        help='worker processes (numpy engine only).')
+    parser.add_argument('--scaling', nargs='+', type=int, metavar='WORKERS',
+                        help='report speedup for these worker counts.')
+    parser.add_argument('-o', '--output', help='append JSON line to file.')
+    return parser
+
+
+if __name__ == '__main__':
+    mc_parser = create_parser()
+    mc_args = mc_parser.parse_args()
+    if mc_args.hands < 1 or mc_args.sessions < 1:
+        mc_parser.error('hands and sessions must be positive')
+    if (mc_args.workers or mc_args.scaling) and mc_args.engine != 'numpy':
+        mc_parser.error('--workers and --scaling need the numpy engine')
+    if mc_args.decks < 1 or not 0 <= mc_args.penetration < 1:
+        mc_parser.error('need at least one deck and penetration in [0, 1)')
+    if mc_args.penetration and mc_args.engine != 'python':
+        mc_parser.error('--penetration needs the python engine')
+    if mc_args.scaling:
+        mc_runs = list(scaling(mc_args.hands, mc_args.scaling,
+                               mc_args.strategy, mc_args.seed,
+                               mc_args.sessions, mc_args.amount,
+                               mc_args.bet, mc_args.betting, mc_args.decks))
+        for mc_stats in mc_runs:
+            print(f"{mc_stats['workers']:>3} workers: "
+                  f"{mc_stats['hands_per_sec']:>12.0f} hands/s, "
+                  f"speedup {mc_stats['speedup']:.2f}, "
+                  f"efficiency {mc_stats['efficiency']:.2f}")
+    elif mc_args.workers:
+        mc_runs = [run_parallel(mc_args.hands, mc_args.strategy,
+                                mc_args.workers, mc_args.seed,
+                                mc_args.sessions, mc_args.amount,
+                                mc_args.bet, mc_args.betting,
+                                mc_args.decks)]
+        print(format_parallel(mc_runs[0]))
+    else:
+        mc_runs = [run(mc_args.hands, mc_args.strategy, mc_args.engine,
+                       mc_args.seed, mc_args.sessions, mc_args.amount,
+                       mc_args.bet, mc_args.betting, mc_args.decks,
+                       mc_args.penetration)]
+        print(format_stats(mc_runs[0]))
+    if mc_args.output:
+        with open(mc_args.output, 'a') as file:
+            for mc_stats in mc_runs:
+                file.write(json.dumps(mc_stats) + '\n')
@@ -0,0 +1,288 @@
+"""Exact dealer outcomes and basic strategy tables for black jack.
+
+The rules are those of game() in black_jack.py: the dealer hits below
+DEALER_STANDS (soft hands included), there is no peek and no bonus for
+black jack, check_win pushes ties and a double may be followed by more
+hits, so doubling is worth exactly twice hitting.
+
+Shoe compositions are tuples of counts of ranks 2-9, tens and aces.
+Solver memoizes the dealer's outcome distribution over (dealer hand,
+remaining shoe) and the player's values over (player hand, remaining
+shoe, upcard). Tables average the exact values over all player hands
+with the same total, weighted by their chance to be dealt.
+"""
+import argparse
+import hashlib
+import json
+import os
+from math import comb
+
+from black_jack import DEALER_STANDS, Card
+
+SOLVER_VERSION = 1
+ACTIONS = 'SHD'
+RANK_POINTS = (2, 3, 4, 5, 6, 7, 8, 9, 10, 11)
+CACHE_DIR = os.path.expanduser('~/.cache/black_jack')
+
+
+def shoe_counts(decks):
+    """Composition of a full shoe of decks."""
+    counts = [0]*len(RANK_POINTS)
+    for points in Card.points:
+        counts[RANK_POINTS.index(points)] += decks
+    return tuple(counts)
+
+
+def add_points(total, soft, points):
+    """Total and soft flag of a hand after a card, aces as in Hands."""
+    total += points
+    soft_aces = int(soft) + (points == 11)
+    while total > 21 and soft_aces:
+        total -= 10
+        soft_aces -= 1
+    return total, soft_aces > 0
+
+
+def rules(decks):
+    """Rule set the tables depend on."""
+    return {
+        'decks': decks,
+        'dealer_stands': DEALER_STANDS,
+        'dealer_hits_soft': False,
+        'double': 'any time, more hits allowed',
+        'tie': 'push',
+        'blackjack_pays': 1,
+        'solver': SOLVER_VERSION,
+    }
+
+
+def rules_hash(decks):
+    """Short hash of the rule set, key of the disk cache."""
+    text = json.dumps(rules(decks), sort_keys=True)
+    return hashlib.sha1(text.encode()).hexdigest()[:16]
+
+
+class Solver():
+    """Exact expected values of player actions for one rule set."""
+
+    def __init__(self, stands=DEALER_STANDS):
+        """Create solver with empty caches."""
+        self.stands = stands
+        self.outcomes = 21 - stands + 2  # Totals stands..21 and bust
+        self._dealer = {}
+        self._player = {}
+
+    def dealer(self, total, soft, counts):
+        """Chances of dealer totals stands..21 and of bust (last)."""
+        if total > 21:
+            return (0.0,)*(self.outcomes - 1) + (1.0,)
+        if total >= self.stands:
+            chances = [0.0]*self.outcomes
+            chances[total - self.stands] = 1.0
+            return tuple(chances)
+        key = (total, soft, counts)
+        chances = self._dealer.get(key)
+        if chances is None:
+            chances = [0.0]*self.outcomes
+            left = sum(counts)
+            for rank, count in enumerate(counts):
+                if count:
+                    rest = counts[:rank] + (count - 1,) + counts[rank+1:]
+                    after = self.dealer(
+                        *add_points(total, soft, RANK_POINTS[rank]), rest)
+                    for index, chance in enumerate(after):
+                        chances[index] += count/left*chance
+            chances = self._dealer[key] = tuple(chances)
+        return chances
+
+    def stand(self, total, upcard, counts):
+        """Value of standing on total against upcard points."""
+        chances = self.dealer(upcard, upcard == 11, counts)
+        value = chances[-1]
+        for index, chance in enumerate(chances[:-1]):
+            dealer = self.stands + index
+            value += chance*((total > dealer) - (total < dealer))
+        return value
+
+    def actions(self, total, soft, upcard, counts):
+        """Values of stand, hit and double per initial bet.
+
+        counts - shoe without the player's cards and the upcard (the
+        closed card is still unknown).
+        """
+        key = (total, soft, upcard, counts)
+        values = self._player.get(key)
+        if values is None:
+            hit = 0.0
+            left = sum(counts)
+            for rank, count in enumerate(counts):
+                if count:
+                    rest = counts[:rank] + (count - 1,) + counts[rank+1:]
+                    after, after_soft = add_points(total, soft,
+                                                   RANK_POINTS[rank])
+                    hit += count/left*(
+                        self.value(after, after_soft, upcard, rest)
+                        if after <= 21 else -1.0)
+            stand = self.stand(total, upcard, counts)
+            values = self._player[key] = (stand, hit, 2*hit)
+        return values
+
+    def value(self, total, soft, upcard, counts):
+        """Value of the best play."""
+        return max(self.actions(total, soft, upcard, counts))
+
+
+def hands(counts, cards=(), total=0, soft=False):
+    """Player hands of two and more cards that did not bust.
+
+    Yield (total, soft, cards, counts) where cards are rank counts of the
+    hand and counts the rest of the shoe. Cards are taken in rank order,
+    so every composition is yielded once.
+    """
+    if len(cards) and sum(cards) >= 2:
+        yield total, soft, cards, counts
+    first = 0
+    for rank in range(len(counts)):
+        if rank < len(cards) and cards[rank]:
+            first = rank
+    for rank in range(first, len(counts)):
+        if not counts[rank]:
+            continue
+        after, after_soft = add_points(total, soft, RANK_POINTS[rank])
+        if after > 21:
+            continue
+        taken = list(cards) + [0]*(len(counts) - len(cards))
+        taken[rank] += 1
+        rest = counts[:rank] + (counts[rank] - 1,) + counts[rank+1:]
+        yield from hands(rest, tuple(taken), after, after_soft)
+
+
+def chance(full, cards):
+    """Chance to be dealt a composition of cards from shoe full."""
+    ways = 1
+    for count, taken in zip(full, cards):
+        ways *= comb(count, taken)
+    return ways/comb(sum(full), sum(cards))
+
+
+def build_tables(decks=1, solver=None):
+    """Values of actions as nested lists [first][soft][total][upcard].
+
+    Each entry is [stand, hit, double] or None for impossible hands,
+    first - the hand has two cards.
+    """
+    solver = solver or Solver()
+    full = shoe_counts(decks)
+    sums = [[[[None]*12 for _ in range(22)] for _ in range(2)]
+            for _ in range(2)]
+    for up_rank, up_points in enumerate(RANK_POINTS):
+        shoe = full[:up_rank] + (full[up_rank] - 1,) + full[up_rank+1:]
+        for total, soft, cards, counts in hands(shoe):
+            weight = chance(shoe, cards)
+            values = solver.actions(total, soft, up_points, counts)
+            cell = sums[int(sum(cards) == 2)][int(soft)][total]
+            if cell[up_points] is None:
+                cell[up_points] = [0.0, 0.0, 0.0, 0.0]
+            for index, value in enumerate(values):
+                cell[up_points][index] += weight*value
+            cell[up_points][3] += weight
+    for first in sums:
+        for soft in first:
+            for cells in soft:
+                for upcard, cell in enumerate(cells):
+                    if cell is not None:
+                        cells[upcard] = [value/cell[3] for value in cell[:3]]
+    return sums
+
+
+def best_action(values):
+    """Action with the highest value: 'S', 'H' or 'D'."""
+    return ACTIONS[max(range(3), key=lambda index: values[index])]
+
+
+def load_tables(decks=1, cache_dir=CACHE_DIR, report=None):
+    """Tables for decks from the disk cache, built and saved if missing.
+
+    report - called with a message before a build, which takes seconds.
+    """
+    path = os.path.join(cache_dir, f'strategy-{rules_hash(decks)}.json')
+    try:
+        with open(path) as file:
+            return json.load(file)['values']
+    except (OSError, ValueError, KeyError):
+        pass
+    if report:
+        report(f'Computing strategy tables for {decks} deck(s)...')
+    tables = build_tables(decks)
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(path + '.tmp', 'w') as file:
+        json.dump({'rules': rules(decks), 'values': tables}, file)
+    os.replace(path + '.tmp', path)
+    return tables
+
+
+def lookup(tables, total, soft, upcard, first):
+    """Values of actions for a hand, None if the tables have no such hand."""
+    values = tables[int(first)][int(soft)][total][upcard]
+    if values is None:
+        values = tables[1 - int(first)][int(soft)][total][upcard]
+    return values
+
+
+def basic_strategy(tables):
+    """Strategy function for monte_carlo that plays by tables."""
+    def basic(total, soft, upcard, first):
+        """Basic strategy: action with the highest value in tables."""
+        values = lookup(tables, total, soft, upcard, first)
+        if values is None:
+            return 'H' if total < DEALER_STANDS else 'S'
+        return best_action(values)
+    return basic
+
+
+def advisor(tables):
+    """Footer function for game(): keys with values of their actions."""
+    def advice(total, soft, upcard, first):
+        """Keys with expected win per bet of hit, stand and double."""
+        values = lookup(tables, total, soft, upcard, first)
+        if values is None:
+            return None
+        stand, hit, double = values
+        return (f'(H)it {hit:+.2f} (S)tand {stand:+.2f} '
+                f'(D)ouble {double:+.2f} (Q)uit')
+    return advice
+
+
+def format_tables(tables):
+    """Two-card basic strategy chart: hard and soft totals by upcard."""
+    upcards = range(2, 12)
+    lines = ['     ' + ''.join(f'{"A" if up == 11 else up:>3}'
+                               for up in upcards)]
+    for soft, title in ((0, 'hard'), (1, 'soft')):
+        lines.append(title)
+        for total in range(4, 22):
+            row = [lookup(tables, total, soft, up, True) for up in upcards]
+            if all(values is None for values in row):
+                continue
+            lines.append(f'{total:>4} ' + ''.join(
+                f'{best_action(values) if values else ".":>3}'
+                for values in row))
+    return '\n'.join(lines)
+
+
+def create_parser():
+    """Create parser for programm."""
+    parser = argparse.ArgumentParser(
+        description='Black Jack basic strategy tables.',
+        epilog='@2022 Sany Thceren.'
+    )
+    parser.add_argument('-d', '--decks', default=1, type=int,
+                        help='decks in shoe.')
+    parser.add_argument('--cache', default=CACHE_DIR,
+                        help='directory for computed tables.')
+    return parser
+
+
+if __name__ == '__main__':
+    st_args = create_parser().parse_args()
+    print(format_tables(load_tables(st_args.decks, st_args.cache)))
@@ -0,0 +1,284 @@
+"""Tests for black_jack."""
+
+import shutil
+import tempfile
+import unittest
+from array import array
+from collections import Counter
+from random import Random
+from unittest import mock
+
+import black_jack as bj
+import monte_carlo as mc
+import strategy as st
+
+
+def hand(*values):
+    result = bj.Hands('test')
+    for value in values:
+        result.put_card(bj.Card(value, '♠'))
+    return result
+
+
+def order(*values):
+    """Card indexes dealing values first, the rest of the deck after."""
+    chosen = []
+    for value in values:
+        index = next(index for index, card in enumerate(mc.CARDS)
+                     if card.value == value and index not in chosen)
+        chosen.append(index)
+    return chosen + [index for index in range(len(mc.CARDS))
+                     if index not in chosen]
+
+
+class TestHands(unittest.TestCase):
+
+    def test_score_and_soft(self):
+        self.assertEqual(hand('A', '6').score(), 17)
+        self.assertTrue(hand('A', '6').soft())
+        self.assertEqual(hand('A', '6', 'K').score(), 17)
+        self.assertFalse(hand('A', '6', 'K').soft())
+        self.assertEqual(hand('A', 'A', '9').score(), 21)
+        self.assertTrue(hand('A', 'A', '9').soft())
+
+    def test_reset(self):
+        player = hand('A', 'K', 'A')
+        player.reset()
+        player.put_card(bj.Card('5', '♥'))
+        self.assertEqual((player.score(), player.soft()), (5, False))
+
+
+class TestCard(unittest.TestCase):
+
+    def test_index_encoding(self):
+        deck = bj.Deck().deck
+        self.assertEqual([card.index for card in deck], list(range(52)))
+        for card in deck:
+            same = bj.Card(card.value, card.suit)
+            self.assertEqual(same.index, card.index)
+            self.assertEqual(card.get_open()[1],
+                             '║' + card.value.ljust(3) + '║')
+            self.assertEqual(card.get_open()[2], f'║ {card.suit} ║')
+        self.assertEqual(bj.Card.points[deck[-1].index], 11)
+        self.assertEqual(bj.Card.points[bj.Card('D', '♣').index], 10)
+
+    def test_shared(self):
+        self.assertIs(bj.Deck().deck[7], bj.Deck().deck[7])
+        ten, jack = bj.Card('10', '♥'), bj.Card('J', '♥')
+        self.assertIs(ten.get_open()[2], jack.get_open()[2])
+        with self.assertRaises(AttributeError):
+            ten.colour = 'red'
+
+
+class TestShoe(unittest.TestCase):
+
+    def test_deals_whole_shoe(self):
+        shoe = bj.Shoe(3, 0.8, Random(1))
+        cards = [shoe.get_card() for _ in range(3*52)]
+        self.assertEqual(Counter(card.index for card in cards),
+                         Counter(list(range(52))*3))
+        self.assertEqual(shoe.running_count, 0)
+        self.assertEqual(shoe.true_count(), 0.0)
+        shoe.new_round()
+        shoe.get_card()
+        self.assertEqual(shoe.position, 1)
+
+    def test_empty_mid_round(self):
+        shoe = bj.Shoe(1, 0.9, Random(4))
+        for _ in range(40):
+            shoe.get_card()
+        shoe.new_round()
+        self.assertEqual(shoe.position, 40)
+        buffer = shoe.cards
+        cards = [shoe.get_card().index for _ in range(20)]
+        self.assertEqual(len(set(cards)), 20)  # Nothing on the table twice
+        self.assertEqual(shoe.position, 20)
+        self.assertEqual(list(shoe.cards[:20]), cards)
+        self.assertEqual(sorted(shoe.cards), list(range(52)))
+        self.assertIs(shoe.cards, buffer)
+        self.assertEqual(shoe.running_count,
+                         sum(bj.Card.hi_lo[index] for index in cards))
+
+    def test_cut_card(self):
+        shoe = bj.Shoe(2, 0.5, Random(2))
+        buffer = shoe.cards
+        for _ in range(51):
+            shoe.get_card()
+        shoe.new_round()
+        self.assertEqual(shoe.position, 51)
+        shoe.get_card()
+        shoe.new_round()
+        self.assertEqual(shoe.position, 0)
+        self.assertIs(shoe.cards, buffer)
+
+    def test_running_count(self):
+        shoe = bj.Shoe(1, 0.5, Random(3))
+        shoe.cards[:3] = array('B', [0, 36, 51])  # 2♥, J♥, A♠
+        self.assertEqual([shoe.get_card().value for _ in range(3)],
+                         ['2', 'J', 'A'])
+        self.assertEqual(shoe.running_count, -1)
+        self.assertAlmostEqual(shoe.true_count(), -52/49)
+
+
+class TestReference(unittest.TestCase):
+
+    def test_dealer_busts(self):
+        # Dealer 10 + 6 takes a king, player stands on 18
+        result, amount = mc.play_reference(
+            order('10', '6', '9', '9', 'K'), mc.cautious)
+        self.assertEqual((result, amount), ('win', 1))
+
+    def test_double_pays_twice(self):
+        result, amount = mc.play_reference(
+            order('10', '7', '5', '6', 'K'), mc.doubler)
+        self.assertEqual((result, amount), ('win', 2))
+        result, amount = mc.play_reference(
+            order('10', '9', '5', '6', '2', '5'), mc.doubler)
+        self.assertEqual((result, amount), ('loss', -2))
+
+    def test_bust_loses_before_dealer(self):
+        result, amount = mc.play_reference(
+            order('10', '2', '10', '6', 'K'), mc.dealer_like)
+        self.assertEqual((result, amount), ('lose', -1))
+
+
+@unittest.skipIf(mc.np is None, 'numpy is not installed')
+class TestNumpyEngine(unittest.TestCase):
+
+    def test_matches_reference(self):
+        rng = mc.np.random.default_rng(5)
+        decks = mc.np.array([rng.permutation(52) for _ in range(2000)],
+                            dtype=mc.np.int8)
+        for strategy in mc.STRATEGIES.values():
+            expected = [mc.play_reference(list(deck), strategy)[1]
+                        for deck in decks]
+            played = mc.play_decks(decks.copy(), mc.strategy_table(strategy))
+            self.assertEqual(played.tolist(), expected)
+
+    def test_multi_deck_matches_reference(self):
+        rng = mc.np.random.default_rng(6)
+        shoes = mc.np.array([rng.permutation(104) % 52 for _ in range(500)],
+                            dtype=mc.np.int8)
+        expected = [mc.play_reference(list(shoe), mc.doubler)[1]
+                    for shoe in shoes]
+        played = mc.play_decks(shoes.copy(), mc.strategy_table(mc.doubler))
+        self.assertEqual(played.tolist(), expected)
+
+    def test_repeatable(self):
+        first = mc.simulate_numpy(10000, mc.doubler, seed=3, chunk=4096)
+        second = mc.simulate_numpy(10000, mc.doubler, seed=3, chunk=4096)
+        self.assertEqual(first.tolist(), second.tolist())
+
+    def test_bankroll(self):
+        outcomes = mc.np.array([-1, -1, 1, 0, 1, -1])
+        flat = mc.bankroll(outcomes, 2, 100, 10)
+        self.assertEqual(flat.tolist(), [[90, 80, 90], [100, 110, 100]])
+        doubled = mc.bankroll(outcomes, 1, 100, 10, mc.martingale)
+        self.assertEqual(doubled.tolist()[0], [90, 70, 110, 110, 120, 110])
+
+
+@unittest.skipIf(mc.np is None, 'numpy is not installed')
+class TestParallel(unittest.TestCase):
+
+    def test_merge_matches_whole(self):
+        values = mc.simulate_numpy(30000, mc.doubler, seed=1)
+        whole = mc.RunningStats()
+        whole.add(values, values[:100])
+        merged = mc.RunningStats()
+        for part in (values[:1000], values[1000:17000], values[17000:]):
+            shard = mc.RunningStats()
+            shard.add(part, part[:100] if len(part) == 1000 else ())
+            merged.merge(shard)
+        self.assertEqual(merged.count, whole.count)
+        self.assertAlmostEqual(merged.mean, whole.mean)
+        self.assertAlmostEqual(merged.m2, whole.m2, places=6)
+        self.assertEqual(merged.outcomes, whole.outcomes)
+        self.assertEqual(merged.summary()['final_p50'],
+                         whole.summary()['final_p50'])
+        self.assertAlmostEqual(whole.summary()['variance'], values.var())
+
+    def test_reproducible(self):
+        def result(workers, seed):
+            stats = mc.run_parallel(20000, 'doubler', workers, seed,
+                                    sessions=10)
+            del stats['seconds'], stats['hands_per_sec']
+            return stats
+        self.assertEqual(result(2, 4), result(2, 4))
+        self.assertNotEqual(result(2, 4), result(2, 5))
+        self.assertEqual(result(1, 4)['hands'], 20000)
+
+
+def dealer_outcomes(dealer, shoe):
+    """Dealer totals by brute force: every order of cards in shoe."""
+    if dealer.score() >= bj.DEALER_STANDS:
+        return Counter({min(dealer.score(), 22): 1.0})
+    outcomes = Counter()
+    for value in set(shoe):
+        rest = list(shoe)
+        rest.remove(value)
+        after = hand(*[card.value for card in dealer.cards], value)
+        for total, chance in dealer_outcomes(after, rest).items():
+            outcomes[total] += shoe.count(value)/len(shoe)*chance
+    return outcomes
+
+
+class TestStrategy(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.cache = tempfile.mkdtemp()
+        cls.tables = st.load_tables(1, cls.cache)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.cache)
+
+    def test_dealer_matches_brute_force(self):
+        shoe = ['2', '3', '5', '6', '6', '10', 'K', 'A', 'A']
+        counts = [0]*len(st.RANK_POINTS)
+        for value in shoe:
+            counts[st.RANK_POINTS.index(
+                bj.Card.rank_points[bj.Deck.values.index(value)])] += 1
+        solver = st.Solver()
+        for upcard in ('4', 'A'):
+            expected = dealer_outcomes(hand(upcard), shoe)
+            points = hand(upcard).score()
+            chances = solver.dealer(points, points == 11, tuple(counts))
+            for index, chance in enumerate(chances):
+                self.assertAlmostEqual(
+                    chance, expected[bj.DEALER_STANDS + index])
+
+    def test_cache(self):
+        with mock.patch.object(st, 'build_tables') as build:
+            self.assertEqual(st.load_tables(1, self.cache), self.tables)
+            build.assert_not_called()
+
+    def test_cold_cache_reported(self):
+        messages = []
+        st.load_tables(1, self.cache, messages.append)
+        self.assertEqual(messages, [])
+        with tempfile.TemporaryDirectory() as cache:
+            with mock.patch.object(st, 'build_tables',
+                                   return_value=self.tables):
+                st.load_tables(1, cache, messages.append)
+        self.assertEqual(len(messages), 1)
+
+    def test_chart(self):
+        basic = st.basic_strategy(self.tables)
+        self.assertEqual(basic(11, False, 6, True), 'D')
+        self.assertEqual(basic(16, False, 10, True), 'H')
+        self.assertEqual(basic(13, False, 4, False), 'S')
+        self.assertEqual(basic(18, True, 10, True), 'H')
+        self.assertEqual(basic(17, False, 11, False), 'S')
+
+    @unittest.skipIf(mc.np is None, 'numpy is not installed')
+    def test_beats_fixed_strategies(self):
+        basic = mc.simulate_numpy(200000, st.basic_strategy(self.tables),
+                                  seed=2).mean()
+        for strategy in mc.STRATEGIES.values():
+            self.assertGreater(
+                basic, mc.simulate_numpy(200000, strategy, seed=2).mean())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+"""Воспроизводимый бенчмарк летающих лого."""
+
+import argparse
+import json
+
+import flying_logo as fl
+
+SEED = 2022
+HEIGHT = 60
+WIDTH = 160
+COUNTS = [10, 100, 1000, 10000]
+FRAMES = 200
+
+
+def run(counts, frames, render=None):
+    """Прогон обеих реализаций для каждого числа лого."""
+    for count in counts:
+        golden = fl.simulate(frames, count, HEIGHT, WIDTH, SEED, False, render)
+        yield golden
+        if fl.np is not None:
+            stats = fl.simulate(frames, count, HEIGHT, WIDTH, SEED, True,
+                                render)
+            stats['matches_golden'] = stats['checksum'] == golden['checksum']
+            yield stats
+
+
+def create_parser():
+    """Create parser."""
+    parser = argparse.ArgumentParser(
+        description='Бенчмарк летающих лого.',
+        epilog='@2022 Sany Tcheren.'
+    )
+    parser.add_argument('-m', '--logos', nargs='+', type=int, default=COUNTS,
+                        help='logo counts')
+    parser.add_argument('-n', '--frames', type=int, default=FRAMES,
+                        help='frames per run')
+    parser.add_argument('-r', '--render', choices=fl.RENDERERS,
+                        help='include rendering to a virtual field')
+    parser.add_argument('-o', '--output', help='append JSON lines to file')
+    return parser
+
+
+if __name__ == '__main__':
+    my_namespace = create_parser().parse_args()
+    for my_stats in run(my_namespace.logos, my_namespace.frames,
+                        my_namespace.render):
+        line = fl.format_stats(my_stats)
+        if 'matches_golden' in my_stats:
+            line += ', golden ' + ('OK' if my_stats['matches_golden']
+                                   else 'MISMATCH')
+        print(line)
+        if my_namespace.output:
+            with open(my_namespace.output, 'a') as file:
+                file.write(json.dumps(my_stats) + '\n')
@@ -2,23 +2,55 @@
 
 import curses
 import argparse
+import cProfile
+import json
+import unicodedata
+from collections import Counter, deque
+from contextlib import contextmanager
 from enum import Enum
-from random import choice, randint
-from threading import Thread
-from time import sleep
+from queue import Empty, Queue
+import zlib
+from array import array
+from random import Random, getrandbits
+from threading import Lock, Thread
+from time import perf_counter, sleep
+
+try:
+    import numpy as np
+except ImportError:  # Без NumPy доступен только ListLogo
+    np = None
+
+from session import SessionWriter, load_session
+
+
+class Geometry:
+    """Кэш размеров окна curses, перечитывается в invalidate."""
+
+    def __init__(self, window):
+        self.window = window
+        self.invalidate()
+
+    def invalidate(self):
+        """Перечитать размер окна."""
+        self.height, self.width = self.window.getmaxyx()
+
+    def getmaxyx(self):
+        """Размер окна из кэша."""
+        return self.height, self.width
 
 
 class Score:
     """Счет в игре."""
 
-    def __init__(self, stdscr):
+    def __init__(self, stdscr, geometry=None):
         self.stdscr = stdscr
+        self.geometry = geometry or Geometry(stdscr)
         self.value = 0
 
     def render(self):
         """Render score."""
         value = f'SCORE:{self.value}'.ljust(10)
-        height, width = self.stdscr.getmaxyx()
+        height, width = self.geometry.getmaxyx()
         self.stdscr.addstr(height-2, width-12, value, curses.color_pair(3))
 
     def add(self, removed):
@@ -35,6 +67,14 @@ class Direction(Enum):
     DOWN_LEFT = 4
 
 
+STEPS = {  # Смещение (строка, колонка) за один ход по направлению
+    Direction.UP_RIGHT: (1, 2),
+    Direction.UP_LEFT: (1, -2),
+    Direction.DOWN_LEFT: (-1, -2),
+    Direction.DOWN_RIGHT: (-1, 2),
+}
+
+
 class Logo:
     """Логотипы."""
 
@@ -44,13 +84,16 @@ class Logo:
         '🪰', '🐉', '🪶', '🏈', '🪃', '🏐', '🛰', '🔨', '⛏', '🥾', '🕋', '🪂'
     ]
     speed = 5
+    rng = Random()  # Общий генератор, для повторяемых прогонов задается seed
 
-    def __init__(self, field):
+    def __init__(self, field, geometry=None):
         self.field = field
-        height, width = field.getmaxyx()
-        self.value = choice(Logo.sign)
-        self.coord = [randint(2, height-3), 2*randint(2, width//2-3)]
-        self.direct = choice(list(Direction))
+        self.geometry = geometry or Geometry(field)
+        height, width = self.geometry.getmaxyx()
+        self.value = Logo.rng.choice(Logo.sign)
+        self.coord = [Logo.rng.randint(2, height-3),
+                      2*Logo.rng.randint(2, width//2-3)]
+        self.direct = Logo.rng.choice(list(Direction))
         self._speed_count = 0
 
     def __str__(self):
@@ -58,13 +101,17 @@ class Logo:
 
     def render(self):
         """Render alive logo, return removed."""
-        removed = self._move()
+        removed = self.step()
         if not removed:
             self.field.addstr(self.coord[0], self.coord[1], self.value)
         return removed
 
+    def step(self):
+        """Move logo without drawing, return removed."""
+        return self._move()
+
     def _future(self):
-        height, width = self.field.getmaxyx()
+        height, width = self.geometry.getmaxyx()
         coord = {
             self.direct == Direction.UP_RIGHT: (
                 [self.coord[0]+1, self.coord[1]+2]),
@@ -94,7 +141,7 @@ class Logo:
         }[True]
 
     def _move(self):
-        height, width = self.field.getmaxyx()
+        height, width = self.geometry.getmaxyx()
         if self._speed_count >= Logo.speed:
             self._speed_count = 0
             coord = self._future()
@@ -126,6 +173,18 @@ class Logo:
                 ):
                     self._rotate(0)
 
+    def bump_grid(self, grid):
+        """Обработка столкновений по хеш-сетке {координата: число лого}."""
+        # Результат как у bump, True - лого сменило направление.
+        direct = self.direct
+        if self._speed_count == 0:
+            line, column = self.coord
+            if (grid[(line, column-2)] + grid[(line, column+2)]) % 2:
+                self._rotate(1)
+            if (grid[(line-1, column)] + grid[(line+1, column)]) % 2:
+                self._rotate(0)
+        return self.direct != direct
+
     @staticmethod
     def faster():
         """Ускорение лого."""
@@ -141,29 +200,499 @@ class Logo:
 class ListLogo():
     """List logos."""
 
-    def __init__(self, field):
+    def __init__(self, field, geometry=None):
         self.field = field
-        self.logos = [Logo(field)]
+        self.geometry = geometry or Geometry(field)
+        self.logos = [Logo(field, self.geometry)]
 
     def add(self):
         """Add logo."""
-        self.logos.append(Logo(self.field))
+        self.logos.append(Logo(self.field, self.geometry))
 
     def render(self):
         """Render list of logo."""
+        removed = self.step()
+        for logo in self.logos:
+            self.field.addstr(logo.coord[0], logo.coord[1], logo.value)
+        return removed
+
+    def step(self):
+        """Move logos without drawing, return count of removed."""
         removed = []
         for logo in self.logos:
-            remove = logo.render()
+            remove = logo.step()
             if remove:
                 removed.append(logo)
         for logo in removed:
             self.logos.remove(logo)
         return len(removed)
 
+    def cells(self):
+        """Позиции и знаки лого для отрисовки."""
+        return [(logo.coord[0], logo.coord[1], logo.value)
+                for logo in self.logos]
+
     def bump(self):
-        """Обработка столкновений."""
+        """Обработка столкновений, возвращает число поворотов."""
+        # Каждое лого проверяет только соседние ячейки сетки, поэтому
+        # обработка линейна по числу лого.
+        grid = Counter((logo.coord[0], logo.coord[1]) for logo in self.logos)
+        return sum(logo.bump_grid(grid) for logo in self.logos)
+
+    def clamp(self):
+        """Перенос лого внутрь поля после изменения его размера."""
+        height, width = self.geometry.getmaxyx()
         for logo in self.logos:
-            logo.bump(self.logos)
+            logo.coord = [min(max(logo.coord[0], 1), height-2),
+                          min(max(logo.coord[1], 2), width-4)]
+
+    def coords(self):
+        """Координаты всех лого подряд в виде байтов (int64)."""
+        return array('q', [value for logo in self.logos
+                           for value in logo.coord]).tobytes()
+
+
+class LogoSwarm:
+    """Лого в столбцах массивов NumPy, поведение как у ListLogo."""
+
+    def __init__(self, field, count=1, geometry=None):
+        self.field = field
+        self.geometry = geometry or Geometry(field)
+        self.line = np.zeros(0, dtype=np.int64)
+        self.column = np.zeros(0, dtype=np.int64)
+        self.d_line = np.zeros(0, dtype=np.int64)
+        self.d_column = np.zeros(0, dtype=np.int64)
+        self.speed_count = np.zeros(0, dtype=np.int64)
+        self.glyph = np.zeros(0, dtype=np.int16)
+        self.add(count)
+
+    def __len__(self):
+        return len(self.line)
+
+    def _extend(self, rows):
+        """Лого из строк (знак, строка, колонка, направление, такт)."""
+        if not rows:
+            return
+        glyph, line, column, direct, speed_count = zip(*rows)
+        d_line, d_column = zip(*(STEPS[value] for value in direct))
+        # Одно присоединение на пачку: по одному лого рой строится за O(n^2)
+        for name, values in (('line', line), ('column', column),
+                             ('d_line', d_line), ('d_column', d_column),
+                             ('speed_count', speed_count), ('glyph', glyph)):
+            current = getattr(self, name)
+            setattr(self, name, np.concatenate(
+                (current, np.array(values, dtype=current.dtype))))
+
+    def add(self, count=1):
+        """Add count logos."""
+        height, width = self.geometry.getmaxyx()
+        rows = []
+        for _ in range(count):  # Порядок случайных чисел как у Logo
+            glyph = Logo.sign.index(Logo.rng.choice(Logo.sign))
+            line = Logo.rng.randint(2, height-3)
+            column = 2*Logo.rng.randint(2, width//2-3)
+            rows.append((glyph, line, column,
+                         Logo.rng.choice(list(Direction)), 0))
+        self._extend(rows)
+
+    @classmethod
+    def from_logos(cls, field, logos):
+        """Рой с тем же состоянием, что у списка объектов Logo."""
+        swarm = cls(field, 0)
+        swarm._extend([(Logo.sign.index(logo.value), *logo.coord,
+                        logo.direct, logo._speed_count) for logo in logos])
+        return swarm
+
+    def _move(self):
+        """Движение всех лого, возвращает маску удаленных в углах."""
+        height, width = self.geometry.getmaxyx()
+        moving = self.speed_count >= Logo.speed
+        self.speed_count = np.where(moving, 0, self.speed_count + 1)
+        self.line = np.where(
+            moving, np.clip(self.line + self.d_line, 0, height-1), self.line)
+        self.column = np.where(
+            moving, np.clip(self.column + self.d_column, 0, width-2),
+            self.column)
+        self.d_column[moving & (
+            (self.column-1 < 0) | (self.column+2 >= width))] *= -1
+        self.d_line[moving & (
+            (self.line-1 < 0) | (self.line+1 >= height))] *= -1
+        return (((self.line == 0) | (self.line == height-1)) &
+                ((self.column == 0) | (self.column == width-2)))
+
+    def render(self):
+        """Render swarm, return count of removed."""
+        removed = self.step()
+        for line, column, value in self.cells():
+            self.field.addstr(line, column, value)
+        return removed
+
+    def step(self):
+        """Move swarm without drawing, return count of removed."""
+        removed = self._move()
+        count = int(np.count_nonzero(removed))
+        if count:
+            alive = ~removed
+            for name in ('line', 'column', 'd_line', 'd_column',
+                         'speed_count', 'glyph'):
+                setattr(self, name, getattr(self, name)[alive])
+        return count
+
+    def cells(self):
+        """Позиции и знаки лого для отрисовки."""
+        return [(line, column, Logo.sign[glyph])
+                for line, column, glyph in zip(self.line.tolist(),
+                                               self.column.tolist(),
+                                               self.glyph.tolist())]
+
+    def clamp(self):
+        """Перенос лого внутрь поля после изменения его размера."""
+        height, width = self.geometry.getmaxyx()
+        self.line = np.clip(self.line, 1, height-2)
+        self.column = np.clip(self.column, 2, width-4)
+
+    def coords(self):
+        """Координаты всех лого подряд в виде байтов (int64)."""
+        return np.column_stack((self.line, self.column)).astype(
+            np.int64).tobytes()
+
+    def bump(self):
+        """Столкновения подсчетом лого по ячейкам, число поворотов."""
+        height, width = self.geometry.getmaxyx()
+        stride = width + 4  # Поле с запасом в строку и две колонки по краям
+        keys = (self.line + 1)*stride + self.column + 2
+        grid = np.bincount(keys, minlength=(height+2)*stride)
+        active = self.speed_count == 0
+        flip_column = active & ((grid[keys-2] + grid[keys+2]) % 2 == 1)
+        flip_line = active & ((grid[keys-stride] + grid[keys+stride]) % 2 == 1)
+        self.d_column[flip_column] *= -1
+        self.d_line[flip_line] *= -1
+        return int(np.count_nonzero(flip_column | flip_line))
+
+
+class FieldRenderer:
+    """Отрисовка поля по разнице с прошлым кадром."""
+
+    corners = '☬☫☣☢'  # Левый верхний, левый нижний, правый верхний, нижний
+
+    def __init__(self, field, geometry=None):
+        self.field = field
+        self.geometry = geometry or Geometry(field)
+        self.drawn = {}
+        self.calls = 0  # Вызовов addstr в последнем кадре
+        self.bytes = 0  # Байт текста, переданных в addstr в последнем кадре
+
+    def _put(self, line, column, text):
+        self.field.addstr(line, column, text)
+        self.calls += 1
+        self.bytes += len(text.encode())
+
+    def reset(self):
+        """Полная очистка поля и отрисовка углов."""
+        self.calls = self.bytes = 0
+        height, width = self.geometry.getmaxyx()
+        # field.clear() - будет глючить
+        for line in range(height):
+            self._put(line, 0, ' '*(width-1))
+        top_left, bottom_left, top_right, bottom_right = self.corners
+        self._put(0, 0, top_left)
+        self._put(height-1, 0, bottom_left)
+        self._put(0, width-2, top_right)
+        self._put(height-1, width-2, bottom_right)
+        self.drawn = {}
+
+    def render(self, cells):
+        """Отрисовка кадра из (строка, колонка, знак)."""
+        self.calls = self.bytes = 0
+        frame = {(line, column): value for line, column, value in cells}
+        for line, column in self.drawn.keys() - frame.keys():
+            self._put(line, column, '  ')
+        for (line, column), value in frame.items():
+            if self.drawn.get((line, column)) != value:
+                self._put(line, column, value)
+        self.drawn = frame
+
+
+def glyph_width(text):
+    """Ширина текста в колонках терминала по таблицам Unicode."""
+    return sum(0 if unicodedata.combining(char) or char == '\ufe0f' else
+               2 if unicodedata.east_asian_width(char) in 'WF' else 1
+               for char in text)
+
+
+def measure_widths(window, glyphs):
+    """Ширина знаков в колонках так, как ее считает сам curses."""
+    widths = {}
+    for glyph in glyphs:
+        window.addstr(0, 0, glyph)
+        widths[glyph] = window.getyx()[1]
+    return widths
+
+
+class RowRenderer(FieldRenderer):
+    """Отрисовка поля строками из буфера кадра."""
+
+    def __init__(self, field, geometry=None, widths=None):
+        super().__init__(field, geometry)
+        self.widths = dict(widths or {})
+        self.slots = {}
+        self.rows = []
+
+    def _slot(self, value):
+        """Текст ячейки ровно в две колонки."""
+        slot = self.slots.get(value)
+        if slot is None:
+            width = self.widths.get(value)
+            if width is None:
+                width = glyph_width(value)
+            slot = self.slots[value] = value + ' '*max(0, 2 - width)
+        return slot
+
+    def reset(self):
+        """Полная очистка поля, отрисовка углов и буфера строк."""
+        super().reset()
+        height, width = self.geometry.getmaxyx()
+        self.rows = [[self._slot('  ')]*(width//2) for _ in range(height)]
+        top_left, bottom_left, top_right, bottom_right = self.corners
+        self.rows[0][0] = self._slot(top_left)
+        self.rows[height-1][0] = self._slot(bottom_left)
+        self.rows[0][-1] = self._slot(top_right)
+        self.rows[height-1][-1] = self._slot(bottom_right)
+
+    def render(self, cells):
+        """Отрисовка кадра из (строка, колонка, знак) по строкам."""
+        self.calls = self.bytes = 0
+        frame = {(line, column): value for line, column, value in cells}
+        rows = self.rows
+        dirty = {}
+        blank = self._slot('  ')
+        changes = [(key, blank) for key in self.drawn.keys() - frame.keys()]
+        changes.extend((key, self._slot(value))
+                       for key, value in frame.items()
+                       if self.drawn.get(key) != value)
+        for (line, column), slot in changes:
+            slot_index = column//2
+            rows[line][slot_index] = slot
+            first, last = dirty.get(line, (slot_index, slot_index))
+            dirty[line] = (min(first, slot_index), max(last, slot_index))
+        for line, (first, last) in dirty.items():
+            self._put(line, 2*first, ''.join(rows[line][first:last+1]))
+        self.drawn = frame
+
+
+RENDERERS = {'cells': FieldRenderer, 'rows': RowRenderer}
+
+
+@contextmanager
+def logo_speed(speed):
+    """Скорость лого на время блока, затем прежняя."""
+    saved = Logo.speed
+    Logo.speed = speed
+    try:
+        yield
+    finally:
+        Logo.speed = saved
+
+
+class VirtualField:
+    """Поле без терминала для прогонов без curses."""
+
+    def __init__(self, height, width):
+        self.height = height
+        self.width = width
+
+    def getmaxyx(self):
+        """Размер поля."""
+        return self.height, self.width
+
+    def addstr(self, line, column, text):
+        """Вывод никуда не идет."""
+
+
+def simulate(frames, count, height, width, seed=0, swarm=False, render=None,
+             speed=5):
+    """Прогон frames шагов с count лого без терминала."""
+    # checksum - crc32 координат всех лого на каждом шаге, при одном seed
+    # совпадает у всех реализаций. render - имя рендерера из RENDERERS,
+    # тогда считаются addstr и байты. speed - Logo.speed на время прогона.
+    with logo_speed(speed):
+        Logo.rng.seed(seed)
+        field = VirtualField(height, width)
+        if swarm:
+            logos = LogoSwarm(field, max(count, 1))
+        else:
+            logos = ListLogo(field)
+            for _ in range(count - 1):
+                logos.add()
+        renderer = RENDERERS[render](field) if render else None
+        if renderer is not None:
+            renderer.reset()
+        removed = collisions = checksum = calls = sent = 0
+        start = perf_counter()
+        for _ in range(frames):
+            removed += logos.step()
+            if renderer is not None:
+                renderer.render(logos.cells())
+                calls += renderer.calls
+                sent += renderer.bytes
+            collisions += logos.bump()
+            checksum = zlib.crc32(logos.coords(), checksum)
+        seconds = perf_counter() - start
+        stats = {
+            'backend': 'swarm' if swarm else 'list',
+            'logos': count,
+            'frames': frames,
+            'seconds': seconds,
+            'frames_per_sec': frames/seconds if seconds else float('inf'),
+            'collisions': collisions,
+            'collisions_per_sec': (collisions/seconds if seconds
+                                   else float('inf')),
+            'removed': removed,
+            'checksum': f'{checksum:08x}',
+        }
+        if renderer is not None:
+            stats.update(renderer=render, addstr_calls=calls,
+                         addstr_bytes=sent)
+        return stats
+
+
+def do_action(logos, name):
+    """Действие кнопки по имени ее коллбека (add, faster, slower)."""
+    if name == 'add':
+        logos.add()
+    else:
+        getattr(Logo, name)()
+
+
+def replay(session, swarm=None):
+    """Повтор журнала сессии без терминала с максимальной скоростью."""
+    # diverged - шаг, на котором прогон разошелся с журналом (None -
+    # совпал бит в бит). swarm=None - реализация, с которой записан журнал.
+    with logo_speed(session.speed):
+        swarm = session.swarm if swarm is None else swarm
+        Logo.rng.seed(session.seed)
+        field = VirtualField(session.height, session.width)
+        logos = LogoSwarm(field) if swarm else ListLogo(field)
+        removed = collisions = checksum = ticks = 0
+        diverged = None
+        start = perf_counter()
+        events = session.events + [(session.ticks, 'end', ())]
+        for tick, name, args in events:
+            while ticks < tick:
+                removed += logos.step()
+                collisions += logos.bump()
+                checksum = zlib.crc32(logos.coords(), checksum)
+                ticks += 1
+            if name == 'state':
+                if args != logos.coords() and diverged is None:
+                    diverged = tick
+            elif name == 'resize':
+                field.height, field.width = args
+                logos.geometry.invalidate()
+                logos.clamp()
+            elif name in ('add', 'faster', 'slower'):
+                do_action(logos, name)
+        seconds = perf_counter() - start
+        if checksum != session.checksum and diverged is None:
+            diverged = ticks
+        return {
+            'backend': 'swarm' if swarm else 'list',
+            'logos': len(logos.coords())//16,
+            'frames': ticks,
+            'seconds': seconds,
+            'frames_per_sec': ticks/seconds if seconds else float('inf'),
+            'collisions': collisions,
+            'collisions_per_sec': (collisions/seconds if seconds
+                                   else float('inf')),
+            'removed': removed,
+            'checksum': f'{checksum:08x}',
+            'diverged': diverged,
+        }
+
+
+def format_stats(stats):
+    """Строка со статистикой прогона."""
+    return (f"{stats['backend']:>5} {stats['logos']} logos "
+            f"{stats['frames']} frames in {stats['seconds']:.3f}s: "
+            f"{stats['frames_per_sec']:.1f} frames/s, "
+            f"{stats['collisions_per_sec']:.1f} collisions/s, "
+            f"removed {stats['removed']}, checksum {stats['checksum']}" +
+            (f", {stats['renderer']} renderer: {stats['addstr_calls']} "
+             f"addstr calls, {stats['addstr_bytes']} bytes"
+             if 'renderer' in stats else ''))
+
+
+class FrameStats:
+    """Времена фаз кадра за последние window кадров."""
+
+    phases = ('commands', 'step', 'bump', 'render', 'score', 'update')
+
+    def __init__(self, window=500, output=None):
+        self.times = {phase: deque(maxlen=window)
+                      for phase in ('frame',) + FrameStats.phases}
+        self.current = dict.fromkeys(FrameStats.phases, 0.0)
+        self.frames = 0
+        self.output = open(output, 'w') if output else None
+        self._mark = perf_counter()
+
+    def timed(self, phase, func):
+        """Обертка func, время вызовов которой идет в фазу phase."""
+        current = self.current
+
+        def wrapper(*args):
+            start = perf_counter()
+            result = func(*args)
+            current[phase] += perf_counter() - start
+            return result
+        return wrapper
+
+    def add(self, phase, seconds):
+        """Добавить замер к фазе текущего кадра."""
+        self.current[phase] += seconds
+
+    def lap(self, phase=None):
+        """Отметка: время с прошлой отметки идет в фазу phase (если задана)."""
+        now = perf_counter()
+        if phase is not None:
+            self.current[phase] += now - self._mark
+        self._mark = now
+
+    def end_frame(self, seconds):
+        """Закрыть кадр длительностью seconds (без ожидания)."""
+        self.frames += 1
+        self.times['frame'].append(seconds)
+        for phase, value in self.current.items():
+            self.times[phase].append(value)
+            self.current[phase] = 0.0
+        if self.output is not None:
+            record = {'frame': self.frames}
+            record.update((f'{phase}_ms', round(times[-1]*1000, 4))
+                          for phase, times in self.times.items())
+            self.output.write(json.dumps(record) + '\n')
+
+    def percentiles(self, phase):
+        """p50, p95 и p99 фазы по окну, мс."""
+        times = sorted(self.times[phase])
+        if not times:
+            return 0.0, 0.0, 0.0
+        return tuple(times[min(len(times)-1, int(len(times)*share))]*1000
+                     for share in (0.5, 0.95, 0.99))
+
+    def lines(self):
+        """Таблица перцентилей для оверлея и итогов."""
+        return [f'{"ms":<9}{"p50":>7}{"p95":>7}{"p99":>7}'] + [
+            f'{phase:<9}' + ''.join(
+                f'{value:7.2f}' for value in self.percentiles(phase))
+            for phase in self.times]
+
+    def close(self):
+        """Закрыть файл с замерами."""
+        if self.output is not None:
+            self.output.close()
+
+
+def no_lap(phase=None):
+    """Отметка фазы кадра без замеров."""
 
 
 class Button:
@@ -186,42 +715,54 @@ class Button:
 class GroupButton:
     """Группа кнопок."""
 
-    def __init__(self, stdscr, button):
+    def __init__(self, stdscr, button, geometry=None):
         self.stdscr = stdscr
+        self.geometry = geometry or Geometry(stdscr)
         button.selected = True
         self.buttons = [button]
         self.selected = 0
+        self.dirty = {0}  # Кнопки, которые надо нарисовать в render
 
     def render(self):
-        """Render group of buttons."""
-        height, _ = self.stdscr.getmaxyx()
+        """Render changed buttons of group."""
+        height, _ = self.geometry.getmaxyx()
         column = 2
-        for button in self.buttons:
-            pair = 2 if button.selected else 3
-            self.stdscr.addstr(
-                height-2, column,
-                button.value,
-                curses.color_pair(pair))
+        for index, button in enumerate(self.buttons):
+            if index in self.dirty:
+                pair = 2 if button.selected else 3
+                self.stdscr.addstr(
+                    height-2, column,
+                    button.value,
+                    curses.color_pair(pair))
             column += 1 + len(button.value)
+        self.dirty.clear()
+
+    def invalidate(self):
+        """Все кнопки перерисуются, например после очистки экрана."""
+        self.dirty.update(range(len(self.buttons)))
 
     def add(self, buttons):
         """Add button in group."""
         for button in buttons:
+            self.dirty.add(len(self.buttons))
             self.buttons.append(button)
 
+    def select(self, index):
+        """Перенос выделения на кнопку index."""
+        self.buttons[self.selected].toggle()
+        self.dirty.update((self.selected, index))
+        self.selected = index
+        self.buttons[self.selected].toggle()
+
     def next(self):
         """Выбор следующий кнопки из списка."""
-        self.buttons[self.selected].toggle()
-        self.selected = (
+        self.select(
             self.selected+1 if self.selected < len(self.buttons)-1 else 0)
-        self.buttons[self.selected].toggle()
 
     def back(self):
         """Выбор предыдущей кнопки."""
-        self.buttons[self.selected].toggle()
-        self.selected = (
+        self.select(
             self.selected-1 if self.selected > 0 else len(self.buttons)-1)
-        self.buttons[self.selected].toggle()
 
     def push(self):
         """Нажатие на кнопку."""
@@ -231,9 +772,15 @@ class GroupButton:
 class FlyApp:
     """Base class."""
 
-    phase = 0.01  # Частота обновления экрана
+    phase = 0.01  # Шаг симуляции, с
+    max_ticks = 10  # Шагов симуляции на кадр, остальное отставание теряется
+    # ENTER, SPACE, L_ARROW, R_ARROW, изменение размера терминала, t, T
+    keys = {10: 'push', 32: 'push', 68: 'back', 67: 'next',
+            curses.KEY_RESIZE: 'resize', 116: 'overlay', 84: 'overlay'}
 
-    def __init__(self, stdscr, height, width):
+    def __init__(self, stdscr, height, width, swarm=False, fps=50,
+                 seed=None, recorder=None, session=None, stats=None,
+                 renderer='rows'):
         curses.curs_set(0)
         curses.init_pair(1, curses.COLOR_RED, curses.COLOR_GREEN)
         curses.init_pair(2, curses.COLOR_BLACK, curses.COLOR_WHITE)
@@ -246,76 +793,251 @@ class FlyApp:
 
         field = stdscr.subwin(height, width, 1, 2)
         field.bkgd(' ', curses.color_pair(3))
+        field.nodelay(True)
 
         self.stdscr = stdscr
         self.field = field
+        self.size = (height, width)
+        self.screen_geometry = Geometry(stdscr)
+        self.field_geometry = Geometry(field)
+        self.fps = fps
         self.app_live = True
-        self.score = Score(stdscr)
-        self.logos = ListLogo(field)
+        self.commands = Queue()
+        self.curses_lock = Lock()  # Все вызовы curses обоих потоков
+        self.recorder = recorder
+        self.session = session
+        self.ticks = 0
+        self.checksum = 0
+        self.event = 0
+        self.diverged = None
+        self.stats = stats
+        self.overlay = False
+        self.saved_speed = Logo.speed  # Кнопки и повтор меняют Logo.speed
+        if session is not None:
+            seed = session.seed
+            Logo.speed = session.speed
+        Logo.rng.seed(seed)
+        self.score = Score(stdscr, self.screen_geometry)
+        if swarm:
+            self.logos = LogoSwarm(field, geometry=self.field_geometry)
+        else:
+            self.logos = ListLogo(field, self.field_geometry)
+        if renderer == 'rows':
+            self.renderer = RowRenderer(
+                field, self.field_geometry,
+                measure_widths(field, Logo.sign + list(FieldRenderer.corners)))
+        else:
+            self.renderer = FieldRenderer(field, self.field_geometry)
+        self.renderer.reset()
 
         b_add = Button(' ADD+ ', self.logos.add)
-        b_group = GroupButton(stdscr, b_add)
+        b_group = GroupButton(stdscr, b_add, self.screen_geometry)
         b_next = Button(' FAST ', Logo.faster)
         b_back = Button(' SLOW ', Logo.slower)
         b_quit = Button(' QUIT ', self.quit)
         b_group.add([b_next, b_back, b_quit])
         self.buttons = b_group
+        self.buttons.render()
 
     def quit(self):
         """Выход из симуляции."""
         self.app_live = False
 
-    def _field_clear(self):
-        """Перед каждой отрисовкой стираем поле."""
-        height, width = self.field.getmaxyx()
-        # field.clear() - будет глючить
-        for line in range(height):
-            self.field.addstr(line, 0, ' '*(width-1))
-        self.field.addstr(0, 0, '☬')
-        self.field.addstr(height-1, 0, '☫')
-        self.field.addstr(0, width-2, '☣')
-        self.field.addstr(height-1, width-2, '☢')
+    def resize(self, height=None, width=None):
+        """Подгонка окон под новый размер терминала."""
+        # Поле не больше заданного (по умолчанию - при запуске) и не меньше
+        # минимального, лого за новыми границами переносятся внутрь поля.
+        curses.update_lines_cols()
+        if height is None:
+            height, width = self.size
+        height = max(5, min(height, curses.LINES - 4))
+        width = max(40, min(width, 2*((curses.COLS - 4)//2)))
+        old_height, old_width = self.field_geometry.getmaxyx()
+        try:
+            self.field.resize(min(height, old_height), min(width, old_width))
+            self.stdscr.resize(height+4, width+4)
+            self.field.resize(height, width)
+        except curses.error:  # Терминал меньше минимального поля
+            pass
+        self.screen_geometry.invalidate()
+        self.field_geometry.invalidate()
+        self.stdscr.clear()
+        self.buttons.invalidate()
+        self.logos.clamp()
+        self.renderer.reset()
+
+    def _apply_commands(self):
+        """Выполнение команд из очереди ввода между кадрами."""
+        while True:
+            try:
+                command = self.commands.get_nowait()
+            except Empty:
+                break
+            if command == 'overlay':
+                self.overlay = self.stats is not None and not self.overlay
+                self.renderer.reset()
+            elif self.session is not None:
+                if command == 'resize':  # Размер поля задает журнал
+                    self.resize(*self.field_geometry.getmaxyx())
+                else:
+                    self.quit()
+            elif command == 'resize':
+                self.resize()
+                if self.recorder is not None:
+                    self.recorder.action(self.ticks, 'resize',
+                                         *self.field_geometry.getmaxyx())
+            else:
+                if command == 'push' and self.recorder is not None:
+                    button = self.buttons.buttons[self.buttons.selected]
+                    self.recorder.action(self.ticks, button.action.__name__)
+                getattr(self.buttons, command)()
+        if self.app_live:
+            self.buttons.render()
+
+    def _replay(self):
+        """События журнала перед очередным шагом, False - журнал кончился."""
+        events = self.session.events
+        while (self.event < len(events) and
+               events[self.event][0] == self.ticks):
+            _, name, args = events[self.event]
+            self.event += 1
+            if name == 'state':
+                if args != self.logos.coords() and self.diverged is None:
+                    self.diverged = self.ticks
+            elif name == 'resize':  # Шаг идет вне блокировки цикла кадра
+                with self.curses_lock:
+                    self.resize(*args)
+            elif name != 'quit':  # Повтор заканчивается по концу журнала
+                do_action(self.logos, name)
+        if self.ticks < self.session.ticks:
+            return True
+        if self.checksum != self.session.checksum and self.diverged is None:
+            self.diverged = self.ticks
+        self.quit()
+        return False
+
+    def _tick(self):
+        """Один шаг симуляции длиной FlyApp.phase."""
+        if self.session is not None and not self._replay():
+            return
+        removed = self.logos.step()
+        self.logos.bump()
+        self.score.add(removed)
+        self.ticks += 1
+        if self.recorder is not None or self.session is not None:
+            coords = self.logos.coords()
+            self.checksum = zlib.crc32(coords, self.checksum)
+            if self.recorder is not None and self.recorder.positions:
+                self.recorder.state(self.ticks, coords)
 
     def _render(self):
+        """Цикл с фиксированным шагом симуляции и кадрами не чаще fps."""
+        # Без FrameStats lap - пустая функция no_lap, с ним шаги и
+        # столкновения замеряются обертками, остальное - отметками lap.
+        stats = self.stats
+        lap = no_lap
+        if stats is not None:
+            self.logos.step = stats.timed('step', self.logos.step)
+            self.logos.bump = stats.timed('bump', self.logos.bump)
+            lap = stats.lap
+        frame = 1/self.fps
+        previous = perf_counter()
+        lag = 0.0
         while self.app_live:
-            self._field_clear()
+            frame_start = perf_counter()
+            lap()
+            with self.curses_lock:
+                self._apply_commands()
+            lap('commands')
+            # Реальное время расходуется шагами по FlyApp.phase
+            lag = self._simulate(lag + frame_start - previous)
+            previous = frame_start
+
+            with self.curses_lock:
+                lap()
+                self.renderer.render(self.logos.cells())
+                if self.overlay:
+                    self._render_overlay()
+                lap('render')
+                self.score.render()
+                lap('score')
+                self.field.noutrefresh()
+                self.stdscr.noutrefresh()
+                curses.doupdate()
+                lap('update')
+            if stats is not None:
+                stats.end_frame(perf_counter() - frame_start)
+            sleep(max(0.0, frame - (perf_counter() - frame_start)))
 
-            removed = self.logos.render()
-            self.logos.bump()
-            self.score.add(removed)
-            self.score.render()
+    def _simulate(self, lag):
+        """Шаги симуляции за накопленное время lag, возвращает остаток."""
+        ticks = 0
+        while (lag >= FlyApp.phase and ticks < FlyApp.max_ticks and
+               self.app_live):
+            self._tick()
+            lag -= FlyApp.phase
+            ticks += 1
+        return min(lag, FlyApp.phase)
 
-            self.field.noutrefresh()
-            self.stdscr.noutrefresh()
-            curses.doupdate()
-            sleep(FlyApp.phase)
+    def _render_overlay(self):
+        """Перцентили времени кадра поверх поля."""
+        height, width = self.field_geometry.getmaxyx()
+        for line, text in enumerate(self.stats.lines()[:height-2], 1):
+            text = text[:width-4]
+            self.field.addstr(line, 2, text, curses.color_pair(2))
+            # Лого под оверлеем снова нарисуются после его скрытия
+            for column in range(0, 2 + len(text), 2):
+                self.renderer.drawn.pop((line, column), None)
 
     def _input(self):
         while self.app_live:
-            self.buttons.render()
-            key = self.field.getch()
-            if key in [10, 32]:  # ENTER, SPACE
-                self.buttons.push()
-            elif key == 68:  # L_ARROW
-                self.buttons.back()
-            elif key == 67:  # R_ARROW
-                self.buttons.next()
-
-    def run(self):
+            with self.curses_lock:
+                key = self.field.getch()
+            if key == -1:
+                sleep(FlyApp.phase)
+            elif key in FlyApp.keys:
+                self.commands.put(FlyApp.keys[key])
+
+    def run(self, profile=None):
         """Запуск тредов с отрисовкой и обработкой клавиатуры."""
-        thr_render = Thread(target=self._render, daemon=True)
+        if profile is not None:
+            profiler = cProfile.Profile()
+            thr_render = Thread(target=profiler.runcall,
+                                args=(self._render,), daemon=True)
+        else:
+            thr_render = Thread(target=self._render, daemon=True)
         thr_input = Thread(target=self._input, daemon=True)
-        thr_render.start()
-        thr_input.start()
-        thr_render.join()
+        try:
+            thr_render.start()
+            thr_input.start()
+            thr_render.join()
+        finally:
+            Logo.speed = self.saved_speed
+        if self.recorder is not None:
+            self.recorder.close(self.ticks, self.checksum)
+        if self.stats is not None:
+            self.stats.close()
+        if profile is not None:
+            profiler.dump_stats(profile)
 
 
-def main(stdscr, height=5, width=40):
-    """Flying logo with curses."""
+def main(stdscr, height=5, width=40, swarm=False, fps=50,
+         record=None, positions=False, session=None, stats=None,
+         profile=None, renderer='rows'):
+    """Flying logo with curses, return finished FlyApp."""
     height = 5 if height is None else height if height > 5 else 5
     width = 40 if width is None else 2*(width//2) if width > 40 else 40
-    fly_app = FlyApp(stdscr, height, width)
-    fly_app.run()
+    seed = getrandbits(64)
+    recorder = None
+    if session is not None:
+        height, width = session.height, session.width
+    elif record is not None:
+        recorder = SessionWriter(record, seed, height, width, Logo.speed,
+                                 positions, swarm)
+    fly_app = FlyApp(stdscr, height, width, swarm, fps, seed, recorder,
+                     session, stats, renderer)
+    fly_app.run(profile)
+    return fly_app
 
 
 def create_parser():
@@ -328,10 +1050,88 @@ def create_parser():
                         help="field's height")
     parser.add_argument('-w', '--width', type=int,
                         help="field's width")
+    parser.add_argument('-s', '--swarm', action='store_true',
+                        help='keep logos in NumPy arrays (needs numpy)')
+    parser.add_argument('-f', '--fps', type=int, default=50,
+                        help='target frames per second')
+    parser.add_argument('--headless', action='store_true',
+                        help='simulate without terminal and print statistics')
+    parser.add_argument('-n', '--frames', type=int, default=1000,
+                        help='frames for headless run')
+    parser.add_argument('-m', '--logos', type=int, default=100,
+                        help='logos for headless run')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='random seed (headless runs are repeatable)')
+    parser.add_argument('--record', metavar='FILE',
+                        help='record the session to a binary log')
+    parser.add_argument('--positions', action='store_true',
+                        help='also record logo positions on every step')
+    parser.add_argument('--replay', metavar='FILE',
+                        help='replay a recorded session (with --headless '
+                        'at full speed)')
+    parser.add_argument('-t', '--timing', action='store_true',
+                        help='measure frame phases (overlay on key T)')
+    parser.add_argument('--stats', metavar='FILE',
+                        help='write frame timings as JSON lines '
+                        '(implies --timing)')
+    parser.add_argument('--profile', metavar='FILE',
+                        help='save a cProfile profile of the render loop')
+    parser.add_argument('-r', '--renderer', choices=RENDERERS,
+                        default='rows',
+                        help='field renderer: one addstr per changed row '
+                        '(rows) or per changed cell (cells)')
     return parser
 
 
+def replay_report(path, diverged, ticks, total):
+    """Строка с итогом повтора журнала."""
+    if diverged is not None:
+        return f'{path}: diverged at step {diverged}'
+    if ticks < total:
+        return f'{path}: stopped at step {ticks} of {total}'
+    return f'{path}: {total} steps replayed bit-identical'
+
+
 if __name__ == '__main__':
     my_parser = create_parser()
     my_namespace = my_parser.parse_args()
-    curses.wrapper(main, my_namespace.height, my_namespace.width)
+    if my_namespace.swarm and np is None:
+        my_parser.error('--swarm needs numpy')
+    if my_namespace.fps < 1:
+        my_parser.error('--fps must be positive')
+    my_session = None
+    if my_namespace.replay:
+        try:
+            my_session = load_session(my_namespace.replay)
+        except (OSError, ValueError) as error:
+            my_parser.error(str(error))
+        if my_session.swarm and np is None:
+            my_parser.error('session was recorded with --swarm, needs numpy')
+    if my_session is not None and my_namespace.headless:
+        my_stats = replay(my_session,
+                          my_session.swarm or my_namespace.swarm)
+        print(format_stats(my_stats))
+        print(replay_report(my_namespace.replay, my_stats['diverged'],
+                            my_stats['frames'], my_session.ticks))
+    elif my_namespace.headless:
+        print(format_stats(simulate(
+            my_namespace.frames, my_namespace.logos,
+            max(5, my_namespace.height or 40),
+            max(40, 2*((my_namespace.width or 120)//2)),
+            my_namespace.seed, my_namespace.swarm)))
+    else:
+        my_stats = None
+        if my_namespace.timing or my_namespace.stats:
+            my_stats = FrameStats(output=my_namespace.stats)
+        my_app = curses.wrapper(
+            main, my_namespace.height, my_namespace.width,
+            my_namespace.swarm or bool(my_session and my_session.swarm),
+            my_namespace.fps, my_namespace.record, my_namespace.positions,
+            my_session, my_stats, my_namespace.profile,
+            my_namespace.renderer)
+        if my_session is not None:
+            print(replay_report(my_namespace.replay, my_app.diverged,
+                                my_app.ticks, my_session.ticks))
+        if my_stats is not None:
+            print(f'{my_stats.frames} frames')
+            print('\n'.join(my_stats.lines()))
@@ -0,0 +1,146 @@
+"""Запись и чтение журнала сессии летающих лого."""
+import struct
+from array import array
+from collections import namedtuple
+
+# Журнал двоичный: заголовок с seed, размером поля и скоростью, затем
+# записи <тег><номер шага><данные>. Номер шага хранится разницей с
+# предыдущей записью, числа - varint, смещения лого - zigzag varint
+# от положения того же лого в предыдущем снимке.
+SESSION_MAGIC = b'FLOG'
+SESSION_VERSION = 1
+SESSION_HEADER = struct.Struct('<4sBBQHHB')
+POSITIONS = 1  # Флаги заголовка: в журнале есть снимки положений
+SWARM = 2  # Сессия записана с LogoSwarm
+
+END = 0
+ACTIONS = ('add', 'faster', 'slower', 'quit', 'resize')
+STATE = len(ACTIONS) + 1
+
+Session = namedtuple(
+    'Session', 'seed height width speed swarm positions events ticks checksum')
+
+
+def _varint(value, out):
+    """Дописать неотрицательное число в out."""
+    while value > 0x7f:
+        out.append(value & 0x7f | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _zigzag(value, out):
+    """Дописать число со знаком в out."""
+    _varint(value << 1 if value >= 0 else (-value << 1) - 1, out)
+
+
+class SessionWriter:
+    """Буферизованная запись журнала."""
+
+    def __init__(self, path, seed, height, width, speed,
+                 positions=False, swarm=False):
+        self.file = open(path, 'wb', buffering=1 << 16)
+        self.positions = positions
+        self.tick = 0
+        self.last = array('q')
+        self.file.write(SESSION_HEADER.pack(
+            SESSION_MAGIC, SESSION_VERSION,
+            POSITIONS*positions | SWARM*swarm, seed, height, width, speed))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if not self.file.closed:
+            self.file.close()
+
+    def _record(self, tag, tick):
+        record = bytearray((tag,))
+        _varint(tick - self.tick, record)
+        self.tick = tick
+        return record
+
+    def action(self, tick, name, *args):
+        """Действие кнопки (или resize с новым размером поля)."""
+        record = self._record(ACTIONS.index(name) + 1, tick)
+        for value in args:
+            _varint(value, record)
+        self.file.write(record)
+
+    def state(self, tick, coords):
+        """Снимок положений: coords - байты int64 (line, column) подряд."""
+        current = array('q')
+        current.frombytes(coords)
+        record = self._record(STATE, tick)
+        _varint(len(current)//2, record)
+        last = self.last
+        for index, value in enumerate(current):
+            _zigzag(value - (last[index] if index < len(last) else 0), record)
+        self.last = current
+        self.file.write(record)
+
+    def close(self, tick, checksum):
+        """Конец журнала: число шагов и crc32 траектории."""
+        record = self._record(END, tick)
+        record += struct.pack('<I', checksum)
+        self.file.write(record)
+        self.file.close()
+
+
+def load_session(path):
+    """Заголовок и события журнала (шаг, имя, данные)."""
+    # Данные resize - новый размер поля, state - координаты лого (int64).
+    with open(path, 'rb') as file:
+        data = file.read()
+    if len(data) < SESSION_HEADER.size:
+        raise ValueError(f'{path}: truncated session')
+    (magic, version, flags, seed,
+     height, width, speed) = SESSION_HEADER.unpack_from(data)
+    if magic != SESSION_MAGIC or version != SESSION_VERSION:
+        raise ValueError(f'{path}: not a session')
+    offset = SESSION_HEADER.size
+
+    def varint():
+        nonlocal offset
+        value = shift = 0
+        while True:
+            if offset >= len(data):
+                raise ValueError(f'{path}: truncated session')
+            byte = data[offset]
+            offset += 1
+            value |= (byte & 0x7f) << shift
+            if byte < 0x80:
+                return value
+            shift += 7
+
+    def zigzag():
+        value = varint()
+        return -(value >> 1) - 1 if value & 1 else value >> 1
+
+    events = []
+    tick = 0
+    last = array('q')
+    while offset < len(data):
+        tag = data[offset]
+        offset += 1
+        tick += varint()
+        if tag == END:
+            if offset + 4 > len(data):
+                raise ValueError(f'{path}: truncated session')
+            checksum, = struct.unpack_from('<I', data, offset)
+            return Session(seed, height, width, speed, bool(flags & SWARM),
+                           bool(flags & POSITIONS), events, tick, checksum)
+        if tag == STATE:
+            current = array('q', bytes(16*varint()))
+            for index in range(len(current)):
+                current[index] = zigzag() + (
+                    last[index] if index < len(last) else 0)
+            last = current
+            events.append((tick, 'state', current.tobytes()))
+        elif 0 < tag <= len(ACTIONS):
+            name = ACTIONS[tag - 1]
+            args = (varint(), varint()) if name == 'resize' else ()
+            events.append((tick, name, args))
+        else:
+            raise ValueError(f'{path}: bad record {tag}')
+    raise ValueError(f'{path}: truncated session')
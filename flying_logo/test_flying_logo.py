@@ -0,0 +1,366 @@
+"""Tests for flying_logo."""
+
+import json
+import os
+import random
+import tempfile
+import unittest
+import zlib
+from unittest import mock
+import flying_logo as fl
+import session
+
+
+class FakeField:
+    """Stand-in for a curses window of fixed size."""
+
+    def __init__(self, height, width):
+        self.height = height
+        self.width = width
+        self.calls = []
+        self.size_calls = 0
+
+    def getmaxyx(self):
+        self.size_calls += 1
+        return self.height, self.width
+
+    def addstr(self, line, column, text, attr=0):
+        self.calls.append((line, column, text))
+
+
+def make_logos(field, count, seed):
+    """Logos scattered over field by seed, some in mid-step."""
+    rnd = random.Random(seed)
+    height, width = field.getmaxyx()
+    logos = []
+    for _ in range(count):
+        logo = fl.Logo(field)
+        logo.coord = [rnd.randint(0, height-1), 2*rnd.randint(0, width//2-1)]
+        logo.direct = rnd.choice(list(fl.Direction))
+        logo._speed_count = rnd.choice([0, 0, 1])
+        logos.append(logo)
+    return logos
+
+
+class TestBump(unittest.TestCase):
+
+    def test_grid_matches_scan(self):
+        field = FakeField(6, 12)
+        for seed in range(20):
+            logos = make_logos(field, 30, seed)
+            expected = []
+            for logo in logos:
+                direct = logo.direct
+                logo.bump(logos)
+                expected.append(logo.direct)
+                logo.direct = direct
+            group = fl.ListLogo(field)
+            group.logos = logos
+            group.bump()
+            self.assertEqual([logo.direct for logo in logos], expected)
+
+
+@unittest.skipIf(fl.np is None, 'numpy is not installed')
+class TestSwarm(unittest.TestCase):
+
+    def setUp(self):
+        self.speed = fl.Logo.speed
+
+    def tearDown(self):
+        fl.Logo.speed = self.speed
+
+    def test_swarm_matches_list(self):
+        for speed, (height, width) in [(0, (7, 16)), (2, (12, 40))]:
+            fl.Logo.speed = speed
+            field = FakeField(height, width)
+            logos = make_logos(field, 40, speed)
+            for logo in logos:
+                logo.coord[0] = min(max(logo.coord[0], 1), height-2)
+            group = fl.ListLogo(field)
+            group.logos = logos
+            swarm = fl.LogoSwarm.from_logos(field, logos)
+            for _ in range(60):
+                self.assertEqual(group.render(), swarm.render())
+                group.bump()
+                swarm.bump()
+                self.assertEqual(
+                    [logo.coord for logo in group.logos],
+                    [list(pair) for pair in zip(swarm.line.tolist(),
+                                                swarm.column.tolist())])
+                self.assertEqual(
+                    [fl.STEPS[logo.direct] for logo in group.logos],
+                    list(zip(swarm.d_line.tolist(), swarm.d_column.tolist())))
+
+    def test_headless_checksum(self):
+        first = fl.simulate(300, 50, 20, 60, seed=3)
+        second = fl.simulate(300, 50, 20, 60, seed=3)
+        self.assertEqual(first['checksum'], second['checksum'])
+        self.assertGreater(first['collisions'], 0)
+        other = fl.simulate(300, 50, 20, 60, seed=4)
+        self.assertNotEqual(first['checksum'], other['checksum'])
+        if fl.np is not None:
+            swarm = fl.simulate(300, 50, 20, 60, seed=3, swarm=True,
+                                render='rows')
+            for key in ('checksum', 'collisions', 'removed'):
+                self.assertEqual(swarm[key], first[key])
+
+
+class TestGeometry(unittest.TestCase):
+
+    def test_size_read_once(self):
+        field = FakeField(20, 60)
+        logos = fl.ListLogo(field)
+        for _ in range(30):
+            logos.add()
+        for _ in range(50):
+            logos.step()
+            logos.bump()
+        self.assertEqual(field.size_calls, 1)
+
+    def test_clamp_after_shrink(self):
+        field = FakeField(20, 60)
+        logos = fl.ListLogo(field)
+        logos.logos[0].coord = [15, 50]
+        field.height, field.width = 10, 40
+        logos.geometry.invalidate()
+        logos.clamp()
+        self.assertEqual(logos.logos[0].coord, [8, 36])
+
+
+class TestSession(unittest.TestCase):
+
+    def setUp(self):
+        self.speed = fl.Logo.speed
+        handle, self.path = tempfile.mkstemp(suffix='.flog')
+        os.close(handle)
+
+    def tearDown(self):
+        fl.Logo.speed = self.speed
+        os.remove(self.path)
+
+    def record(self, positions):
+        """Запись сессии так же, как ее ведет FlyApp."""
+        fl.Logo.rng.seed(7)
+        fl.Logo.speed = 3
+        field = fl.VirtualField(20, 60)
+        logos = fl.ListLogo(field)
+        recorder = session.SessionWriter(self.path, 7, 20, 60, 3, positions)
+        actions = {5: 'add', 40: 'add', 41: 'faster', 90: 'slower',
+                   120: 'add'}
+        checksum = 0
+        for tick in range(200):
+            if tick in actions:
+                recorder.action(tick, actions[tick])
+                fl.do_action(logos, actions[tick])
+            if tick == 150:
+                field.height, field.width = 12, 44
+                logos.geometry.invalidate()
+                logos.clamp()
+                recorder.action(tick, 'resize', 12, 44)
+            logos.step()
+            logos.bump()
+            coords = logos.coords()
+            checksum = zlib.crc32(coords, checksum)
+            if positions:
+                recorder.state(tick + 1, coords)
+        recorder.action(200, 'quit')
+        recorder.close(200, checksum)
+        return checksum
+
+    def test_replay_is_identical(self):
+        for positions in (False, True):
+            checksum = self.record(positions)
+            log = session.load_session(self.path)
+            self.assertEqual((log.seed, log.ticks, log.positions),
+                             (7, 200, positions))
+            stats = fl.replay(log)
+            self.assertIsNone(stats['diverged'])
+            self.assertEqual(stats['checksum'], f'{checksum:08x}')
+            if fl.np is not None:
+                self.assertIsNone(fl.replay(log, swarm=True)['diverged'])
+
+    def test_divergence_is_reported(self):
+        self.record(True)
+        log = session.load_session(self.path)
+        tick, name, coords = log.events[20]
+        self.assertEqual(name, 'state')
+        log.events[20] = (tick, name, bytes(len(coords)))
+        self.assertEqual(fl.replay(log)['diverged'], tick)
+
+    def test_speed_restored(self):
+        self.record(False)
+        fl.Logo.speed = 5
+        fl.replay(session.load_session(self.path))
+        self.assertEqual(fl.Logo.speed, 5)
+        first = fl.simulate(100, 20, 20, 60, seed=1)['checksum']
+        fl.Logo.speed = 2
+        self.assertEqual(fl.simulate(100, 20, 20, 60, seed=1)['checksum'],
+                         first)
+        self.assertEqual(fl.Logo.speed, 2)
+
+    def test_truncated_log(self):
+        self.record(False)
+        with open(self.path, 'rb') as file:
+            data = file.read()
+        with open(self.path, 'wb') as file:
+            file.write(data[:-3])
+        with self.assertRaises(ValueError):
+            session.load_session(self.path)
+
+
+class TestFixedStep(unittest.TestCase):
+
+    def make_app(self):
+        """Stub FlyApp without curses that only counts ticks."""
+        app = fl.FlyApp.__new__(fl.FlyApp)
+        app.app_live = True
+        app.ticks = 0
+
+        def tick():
+            app.ticks += 1
+        app._tick = tick
+        return app
+
+    def test_ticks_cap_and_lag(self):
+        app = self.make_app()
+        phase = fl.FlyApp.phase
+        self.assertAlmostEqual(app._simulate(0.5*phase), 0.5*phase)
+        self.assertEqual(app.ticks, 0)
+        self.assertAlmostEqual(app._simulate(3.25*phase), 0.25*phase)
+        self.assertEqual(app.ticks, 3)
+        # Lag beyond max_ticks is dropped, at most one phase is carried over
+        lag = app._simulate((fl.FlyApp.max_ticks + 5.5)*phase)
+        self.assertEqual(app.ticks, 3 + fl.FlyApp.max_ticks)
+        self.assertAlmostEqual(lag, phase)
+        app.app_live = False
+        app._simulate(5*phase)
+        self.assertEqual(app.ticks, 3 + fl.FlyApp.max_ticks)
+
+
+class TestFrameStats(unittest.TestCase):
+
+    def test_percentiles_and_export(self):
+        handle, path = tempfile.mkstemp(suffix='.jsonl')
+        os.close(handle)
+        try:
+            stats = fl.FrameStats(window=100, output=path)
+            calls = []
+            step = stats.timed('step', calls.append)
+            for frame in range(1, 201):
+                step(frame)
+                stats.add('render', 0.001)
+                stats.lap()
+                stats.lap('score')
+                stats.end_frame(frame/1000)
+            stats.close()
+            self.assertEqual(len(calls), 200)
+            self.assertEqual(stats.percentiles('frame'), (151.0, 196.0, 200.0))
+            self.assertAlmostEqual(stats.percentiles('render')[0], 1.0)
+            self.assertLess(stats.percentiles('score')[2], 1.0)
+            self.assertEqual(len(stats.lines()), 1 + 1 + len(stats.phases))
+            with open(path) as file:
+                records = [json.loads(line) for line in file]
+            self.assertEqual(len(records), 200)
+            self.assertEqual(records[-1]['frame_ms'], 200.0)
+            self.assertEqual(records[0]['render_ms'], 1.0)
+        finally:
+            os.remove(path)
+
+
+class TestFieldRenderer(unittest.TestCase):
+
+    def test_only_changes_are_drawn(self):
+        field = FakeField(5, 20)
+        renderer = fl.FieldRenderer(field)
+        renderer.reset()
+        self.assertEqual(renderer.calls, 9)
+        renderer.render([(1, 4, '🚀'), (2, 6, '🛸')])
+        self.assertEqual(renderer.calls, 2)
+        field.calls = []
+        renderer.render([(1, 4, '🚀'), (3, 8, '🛸')])
+        self.assertEqual(field.calls, [(2, 6, '  '), (3, 8, '🛸')])
+        self.assertEqual(renderer.bytes, 2 + 4)
+        renderer.render([(1, 4, '🚀'), (3, 8, '🛸')])
+        self.assertEqual(renderer.calls, 0)
+
+
+class TestGroupButton(unittest.TestCase):
+
+    @mock.patch.object(fl.curses, 'color_pair', lambda pair: pair)
+    def test_only_toggled_buttons_are_drawn(self):
+        field = FakeField(10, 40)
+        group = fl.GroupButton(field, fl.Button(' ADD+ ', None), field)
+        group.add([fl.Button(' FAST ', None), fl.Button(' QUIT ', None)])
+        group.render()
+        self.assertEqual(len(field.calls), 3)
+        field.calls = []
+        group.render()
+        self.assertEqual(field.calls, [])
+        group.back()
+        group.render()
+        self.assertEqual(field.calls, [(8, 2, ' ADD+ '), (8, 16, ' QUIT ')])
+        field.calls = []
+        group.invalidate()
+        group.render()
+        self.assertEqual(len(field.calls), 3)
+
+
+class ScreenField(FakeField):
+    """Window that keeps what a terminal would show, column by column."""
+
+    def __init__(self, height, width):
+        super().__init__(height, width)
+        self.screen = [[' ']*width for _ in range(height)]
+
+    def addstr(self, line, column, text):
+        super().addstr(line, column, text)
+        row = self.screen[line]
+        for char in text:
+            width = fl.glyph_width(char)
+            if row[column] == '':  # Overwrote the right half of a wide glyph
+                row[column-1] = ' '
+            if column + 1 < len(row) and row[column+1] == '':
+                row[column+1] = ' '
+            row[column] = char
+            if width == 2:
+                row[column+1] = ''
+            column += width
+
+
+class TestRowRenderer(unittest.TestCase):
+
+    def test_same_screen_as_cells(self):
+        rnd = random.Random(3)
+        cells_field = ScreenField(8, 30)
+        rows_field = ScreenField(8, 30)
+        cells = fl.FieldRenderer(cells_field)
+        rows = fl.RowRenderer(rows_field)
+        cells.reset()
+        rows.reset()
+        for _ in range(50):
+            frame = {(rnd.randint(1, 6), 2*rnd.randint(1, 13)):
+                     rnd.choice(fl.Logo.sign) for _ in range(12)}
+            frame = [(line, column, value)
+                     for (line, column), value in frame.items()]
+            cells.render(frame)
+            rows.render(frame)
+            self.assertEqual(rows_field.screen, cells_field.screen)
+            self.assertLessEqual(rows.calls, 6)
+
+    def test_one_call_per_row(self):
+        field = FakeField(5, 20)
+        renderer = fl.RowRenderer(field)
+        renderer.reset()
+        renderer.render([(1, 4, '🚀'), (1, 8, '🛰'), (2, 6, '🛸')])
+        self.assertEqual(renderer.calls, 2)
+        field.calls = []
+        renderer.render([(1, 4, '🚀'), (3, 8, '🛸')])
+        self.assertEqual(field.calls, [(1, 8, '  '), (2, 6, '  '),
+                                       (3, 8, '🛸')])
+        renderer.render([(1, 4, '🚀'), (1, 6, '⛏'), (1, 10, '🚀')])
+        self.assertEqual(field.calls[-1], (1, 6, '⛏   🚀'))
+        self.assertEqual(renderer.calls, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+"""Воспроизводимый бенчмарк движков игры Жизнь.
+
+Поля случайные с фиксированным зерном, результаты печатаются строками JSON,
+чтобы их можно было сравнивать между версиями.
+"""
+import argparse
+import json
+
+import live_game as lg
+
+SEED = 2022
+DENSITY = 0.35
+SIZES = [64, 256, 1024, 4096]
+MAX_SIDE = {  # Медленные движки на больших полях не запускаем
+    'python': 256,
+    'sparse': 1024,
+    'infinite': 1024,
+    'hashlife': 256,
+}
+CELL_BUDGET = 1 << 20  # Клеток на один замер: поколения = бюджет / площадь
+
+
+def generations_for(side):
+    """Число поколений для поля side x side."""
+    return max(4, CELL_BUDGET // (side*side))
+
+
+def run(engines, sizes):
+    """Прогон всех сочетаний движков и размеров."""
+    for side in sizes:
+        field = lg.random_field(side, side, DENSITY, SEED)
+        for engine in engines:
+            if side > MAX_SIDE.get(engine, side):
+                continue
+            yield lg.simulate(engine, field, generations_for(side))
+
+
+def measure_parallel(field, generations, workers):
+    """Прогон параллельного движка с workers процессами."""
+    life = lg.ParallelEngine(field, workers=workers)
+    stats = lg.measure(life, generations)
+    life.close()
+    stats['engine'] = 'parallel'
+    stats['workers'] = workers
+    return stats
+
+
+def scaling(sizes, workers):
+    """Ускорение и эффективность параллельного движка по числу процессов.
+
+    Базой служит отдельно замеренный прогон с одним процессом.
+    """
+    for side in sizes:
+        field = lg.random_field(side, side, DENSITY, SEED)
+        generations = generations_for(side)
+        serial = measure_parallel(field, generations, 1)
+        for count in workers:
+            stats = (serial if count == 1
+                     else measure_parallel(field, generations, count))
+            stats['speedup'] = serial['seconds']/stats['seconds']
+            stats['efficiency'] = stats['speedup']/count
+            yield stats
+
+
+def create_parser():
+    """Create parser."""
+    parser = argparse.ArgumentParser(
+        description='Бенчмарк движков игры Жизнь.',
+        epilog='@2022 Sany Tcheren.'
+    )
+    parser.add_argument('-e', '--engines', nargs='+', choices=sorted(lg.ENGINES),
+                        default=sorted(lg.ENGINES), help='engines to measure')
+    parser.add_argument('-s', '--sizes', nargs='+', type=int, default=SIZES,
+                        help='field sides')
+    parser.add_argument('-j', '--workers', nargs='+', type=int,
+                        help='measure scaling of parallel engine '
+                             'for these process counts instead')
+    parser.add_argument('-o', '--output', help='append JSON lines to file')
+    return parser
+
+
+if __name__ == '__main__':
+    my_args = create_parser().parse_args()
+    if my_args.workers:
+        results = scaling(my_args.sizes, my_args.workers)
+    else:
+        results = run(my_args.engines, my_args.sizes)
+    for stats in results:
+        line = lg.format_stats(stats)
+        if 'workers' in stats:
+            line += (f", workers {stats['workers']}, "
+                     f"speedup {stats['speedup']:.2f}, "
+                     f"efficiency {stats['efficiency']:.0%}")
+        print(line)
+        if my_args.output:
+            with open(my_args.output, 'a') as file:
+                file.write(json.dumps(stats) + '\n')
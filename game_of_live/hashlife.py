@@ -0,0 +1,225 @@
+"""Hashlife: игра Жизнь на мемоизированном квадродереве."""
+
+from rules import LIFE
+
+
+class Node:
+    """Канонический узел квадродерева уровня level (сторона 2**level)."""
+
+    __slots__ = ('nw', 'ne', 'sw', 'se', 'level', 'population')
+
+    def __init__(self, nw, ne, sw, se, level, population):
+        self.nw = nw
+        self.ne = ne
+        self.sw = sw
+        self.se = se
+        self.level = level
+        self.population = population
+
+
+class HashLife:
+    """Хранилище канонических узлов и кэш результатов RESULT.
+
+    Кэш результатов ограничен max_cache записями, при переполнении
+    выбрасывается старшая половина. Узлы по одному не выбрасываются, иначе
+    равные поддеревья перестанут быть одним объектом: если их больше
+    max_cache, перед прыжком advance оставляет только узлы текущего дерева
+    и очищает кэш результатов. rule - таблица правила из rules, рождение
+    при нуле соседей не поддерживается.
+    """
+
+    def __init__(self, max_cache=1 << 20, rule=LIFE):
+        if rule[0]:
+            raise ValueError('hashlife does not support B0 rules')
+        self.max_cache = max_cache
+        self.rule = rule
+        self.off = Node(None, None, None, None, 0, 0)
+        self.on = Node(None, None, None, None, 0, 1)
+        self._nodes = {}
+        self._results = {}
+        self._zeros = [self.off]
+
+    @staticmethod
+    def _evict(table):
+        """Удаление старшей половины записей."""
+        for key in list(table)[:len(table)//2]:
+            del table[key]
+
+    def join(self, nw, ne, sw, se):
+        """Канонический узел из четырех потомков."""
+        key = (nw, ne, sw, se)
+        node = self._nodes.get(key)
+        if node is None:
+            node = Node(nw, ne, sw, se, nw.level + 1,
+                        nw.population + ne.population +
+                        sw.population + se.population)
+            self._nodes[key] = node
+        return node
+
+    def zero(self, level):
+        """Пустой узел уровня level."""
+        while len(self._zeros) <= level:
+            zero = self._zeros[-1]
+            self._zeros.append(self.join(zero, zero, zero, zero))
+        return self._zeros[level]
+
+    def centre(self, node):
+        """Узел на уровень выше, в центре которого лежит node."""
+        zero = self.zero(node.level - 1)
+        return self.join(
+            self.join(zero, zero, zero, node.nw),
+            self.join(zero, zero, node.ne, zero),
+            self.join(zero, node.sw, zero, zero),
+            self.join(node.se, zero, zero, zero))
+
+    @staticmethod
+    def is_padded(node):
+        """Все живые клетки лежат в центральной четверти узла."""
+        return (node.nw.population == node.nw.se.se.population and
+                node.ne.population == node.ne.sw.sw.population and
+                node.sw.population == node.sw.ne.ne.population and
+                node.se.population == node.se.nw.nw.population)
+
+    def _life_4x4(self, node):
+        """Центр 2x2 узла уровня 2 через одно поколение."""
+        grid = [
+            [node.nw.nw, node.nw.ne, node.ne.nw, node.ne.ne],
+            [node.nw.sw, node.nw.se, node.ne.sw, node.ne.se],
+            [node.sw.nw, node.sw.ne, node.se.nw, node.se.ne],
+            [node.sw.sw, node.sw.se, node.se.sw, node.se.se]]
+        centre = []
+        for line in (1, 2):
+            for pos in (1, 2):
+                counter = sum(grid[y][x].population
+                              for y in (line-1, line, line+1)
+                              for x in (pos-1, pos, pos+1)
+                              if y != line or x != pos)
+                alive = grid[line][pos].population
+                centre.append(
+                    self.on if self.rule[9*alive + counter] else self.off)
+        return self.join(*centre)
+
+    def successor(self, node, step_log):
+        """Центральный узел уровня level-1 через 2**step_log поколений.
+
+        step_log не больше level-2.
+        """
+        if node.population == 0:
+            return node.nw
+        key = (node, step_log)
+        result = self._results.get(key)
+        if result is not None:
+            return result
+        if node.level == 2:
+            result = self._life_4x4(node)
+        else:
+            join = self.join
+            nw, ne, sw, se = node.nw, node.ne, node.sw, node.se
+            parts = [
+                join(nw.nw, nw.ne, nw.sw, nw.se),
+                join(nw.ne, ne.nw, nw.se, ne.sw),
+                join(ne.nw, ne.ne, ne.sw, ne.se),
+                join(nw.sw, nw.se, sw.nw, sw.ne),
+                join(nw.se, ne.sw, sw.ne, se.nw),
+                join(ne.sw, ne.se, se.nw, se.ne),
+                join(sw.nw, sw.ne, sw.sw, sw.se),
+                join(sw.ne, se.nw, sw.se, se.sw),
+                join(se.nw, se.ne, se.sw, se.se)]
+            if step_log < node.level - 2:
+                # Девять подузлов сдвигаем на полный шаг, затем берем центры
+                c1, c2, c3, c4, c5, c6, c7, c8, c9 = [
+                    self.successor(part, step_log) for part in parts]
+                result = join(
+                    join(c1.se, c2.sw, c4.ne, c5.nw),
+                    join(c2.se, c3.sw, c5.ne, c6.nw),
+                    join(c4.se, c5.sw, c7.ne, c8.nw),
+                    join(c5.se, c6.sw, c8.ne, c9.nw))
+            else:
+                # Две половины шага: сначала девять подузлов, затем четыре
+                c1, c2, c3, c4, c5, c6, c7, c8, c9 = [
+                    self.successor(part, step_log - 1) for part in parts]
+                result = join(
+                    self.successor(join(c1, c2, c4, c5), step_log - 1),
+                    self.successor(join(c2, c3, c5, c6), step_log - 1),
+                    self.successor(join(c4, c5, c7, c8), step_log - 1),
+                    self.successor(join(c5, c6, c8, c9), step_log - 1))
+        if len(self._results) >= self.max_cache:
+            self._evict(self._results)
+        self._results[key] = result
+        return result
+
+    def from_cells(self, cells):
+        """Узел и координата его левого верхнего угла из множества клеток."""
+        if not cells:
+            return self.zero(3), (0, 0)
+        top = min(line for line, _ in cells)
+        left = min(pos for _, pos in cells)
+        size = max(max(line - top, pos - left) for line, pos in cells) + 1
+        level = max(3, (size - 1).bit_length())
+        local = {(line - top, pos - left) for line, pos in cells}
+
+        def build(level, line, pos):
+            if level == 0:
+                return self.on if (line, pos) in local else self.off
+            half = 1 << (level - 1)
+            return self.join(
+                build(level - 1, line, pos),
+                build(level - 1, line, pos + half),
+                build(level - 1, line + half, pos),
+                build(level - 1, line + half, pos + half))
+
+        return build(level, 0, 0), (top, left)
+
+    def to_cells(self, node, origin):
+        """Множество живых клеток узла с углом в origin."""
+        cells = set()
+
+        def walk(node, line, pos):
+            if node.population == 0:
+                return
+            if node.level == 0:
+                cells.add((line, pos))
+                return
+            half = 1 << (node.level - 1)
+            walk(node.nw, line, pos)
+            walk(node.ne, line, pos + half)
+            walk(node.sw, line + half, pos)
+            walk(node.se, line + half, pos + half)
+
+        walk(node, *origin)
+        return cells
+
+    def compact(self, node):
+        """Оставить в таблице только узлы дерева node, очистить кэш."""
+        self._nodes = {}
+        self._results = {}
+        self._zeros = [self.off]
+
+        def keep(node):
+            if node.level == 0:
+                return
+            key = (node.nw, node.ne, node.sw, node.se)
+            if key not in self._nodes:
+                self._nodes[key] = node
+                for child in key:
+                    keep(child)
+
+        keep(node)
+
+    def advance(self, node, origin, generations):
+        """Сдвиг узла на generations поколений прыжками по 2**k."""
+        if len(self._nodes) > self.max_cache:
+            self.compact(node)
+        step_log = 0
+        while generations:
+            if generations & 1:
+                while node.level < step_log + 3 or not self.is_padded(node):
+                    shift = 1 << (node.level - 1)
+                    node = self.centre(node)
+                    origin = (origin[0] - shift, origin[1] - shift)
+                shift = 1 << (node.level - 2)
+                node = self.successor(node, step_log)
+                origin = (origin[0] + shift, origin[1] + shift)
+            generations >>= 1
+            step_log += 1
+        return node, origin
@@ -1,6 +1,26 @@
 """Игра жизнь."""
+import argparse
 import curses
+import os
+import random
+import tracemalloc
+import weakref
+from collections import Counter, deque
 from copy import deepcopy
+from multiprocessing import Pool
+from multiprocessing.shared_memory import SharedMemory
+from threading import Event, Lock, Thread
+from time import perf_counter, sleep
+
+from hashlife import HashLife
+from rules import DEFAULT_RULE, LIFE, compile_rule, rule_text
+from patterns import (centre_cells, load_checkpoint, load_pattern,
+                      save_checkpoint, save_pattern)
+
+try:
+    import numpy as np
+except ImportError:  # NumPy не обязателен, остается движок на чистом Python
+    np = None
 
 def greating():
     """Приветствие."""
@@ -17,12 +37,25 @@ def greating():
             <A>                       установка клетки
             <S>                       переход к игре
             <Q>                       выход из игры
+        Во время игры:
+            <F>                       перемотка на 64 поколения
+            <W>                       сохранение состояния в live_game.chk
+        В автоматическом режиме (-a):
+            <P>,<SPACE>               пауза
+            <N>                       шаг во время паузы
+            <Q>                       остановка
         Для продолжения нажмите любую клавишу
         ''')
 
-def finish(stdscr):
+def finish(stdscr, period=None):
     """Конец игры."""
-    stdscr.addstr(0,0,'Жизнь погибла, для выхода нажмите Q, для новой жизни нажмите R')
+    if period is None:
+        message = 'Жизнь погибла'
+    elif period == 1:
+        message = 'Жизнь застыла'
+    else:
+        message = f'Жизнь повторяется с периодом {period}'
+    stdscr.addstr(0,0,message + ', для выхода нажмите Q, для новой жизни нажмите R')
     is_end = True
     while True:
         key = stdscr.getkey()
@@ -31,30 +64,105 @@ def finish(stdscr):
         if key.upper() in ['R','Q']:
             return is_end
 
+class FieldRenderer:
+    """Отрисовка поля по разнице с предыдущим кадром.
+
+    Изменившиеся клетки одного цвета, идущие подряд, выводятся одним addstr.
+    """
+
+    def __init__(self, stdscr):
+        self.stdscr = stdscr
+        self.previous = None
+        self.redrawn = 0  # Клеток перерисовано в последнем кадре
+        self.calls = 0  # Вызовов addstr в последнем кадре
+
+    def reset(self):
+        """Забыть предыдущий кадр, следующий будет нарисован целиком."""
+        self.previous = None
+
+    def invalidate(self, line, pos):
+        """Пометить клетку поля для перерисовки."""
+        if (self.previous is not None and 0 <= line < len(self.previous)
+                and 0 <= pos < len(self.previous[line])):
+            self.previous[line][pos] = None
+
+    def _flush(self, line, start, end, val):
+        pair = 2 if val else 1
+        self.stdscr.addstr(line+1, 2*start+2, '  '*(end-start),
+                           curses.color_pair(pair))
+        self.redrawn += end - start
+        self.calls += 1
+
+    def draw(self, field):
+        """Отрисовка изменившихся клеток, возвращает их количество."""
+        self.redrawn = 0
+        self.calls = 0
+        previous = self.previous
+        current = []
+        for line, string in enumerate(field):
+            row = [bool(val) for val in string]
+            current.append(row)
+            old = None
+            if previous is not None and line < len(previous):
+                old = previous[line]
+            start = None
+            for pos, val in enumerate(row):
+                changed = old is None or pos >= len(old) or old[pos] != val
+                if start is not None and (not changed or val != row[start]):
+                    self._flush(line, start, pos, row[start])
+                    start = None
+                if changed and start is None:
+                    start = pos
+            if start is not None:
+                self._flush(line, start, len(row), row[start])
+        self.previous = current
+        return self.redrawn
+
 def field_print(stdscr,field):
-    """Печать игрового поля."""
-    for line,string  in enumerate(field):
-        for pos,val in enumerate(string):
-            if val:
-                stdscr.addstr(line+1, 2*pos+2, '  ',curses.color_pair(2))
-            else:
-                stdscr.addstr(line+1, 2*pos+2, '  ',curses.color_pair(1))
+    """Печать игрового поля целиком."""
+    return FieldRenderer(stdscr).draw(field)
+
+def field_size(stdscr):
+    """Размер игрового поля (height, width), помещающегося на экране."""
+    maxyx = stdscr.getmaxyx()
+    return maxyx[0]-2, int(maxyx[1]/2-2)
 
-def init(stdscr):
-    """Инициализация начальных условий."""
+def place_cells(cells, height, width, shape=None):
+    """Клетки на поле height x width.
+
+    shape - размер поля, на котором лежат клетки: его центр совмещается
+    с центром нового поля. None - клетки без поля (образец или состояние
+    бесконечного поля), они ставятся в центр.
+    """
+    if shape is None:
+        return centre_cells(cells, height, width)
+    d_line = (height - shape[0])//2
+    d_pos = (width - shape[1])//2
+    return {(line + d_line, pos + d_pos) for line, pos in cells}
+
+def init(stdscr, renderer=None, cells=None):
+    """Инициализация начальных условий, cells - заранее заданные клетки."""
     maxyx = stdscr.getmaxyx()
+    renderer = FieldRenderer(stdscr) if renderer is None else renderer
 
-    field = [[0]*int(maxyx[1]/2-2) for i in range(maxyx[0]-2)]
+    field = cells_to_field(cells or (), *field_size(stdscr))
 
     coord_y = 0
     coord_x = 0
+    stdscr.clear()
+    renderer.reset()
     while True:
-        stdscr.clear()
-        field_print(stdscr,field)
+        renderer.draw(field)
         stdscr.addstr(coord_y, coord_x, '  ', curses.color_pair(3))
         stdscr.refresh()
 
         key = stdscr.getkey()
+        # Клетку под курсором восстановит следующий кадр, в том числе
+        # первый кадр игры после выхода из расстановки
+        if coord_y > 0 and coord_x > 0:
+            renderer.invalidate(coord_y-1, int(coord_x/2)-1)
+        else:
+            stdscr.addstr(coord_y, coord_x, '  ')
         if key.upper() in ['S','Q']:
             break
         if key.upper() == 'A':
@@ -77,16 +185,12 @@ def field_is_live(field):
                 return True
     return False
 
-def field_next(field):
-    """Преобразование поля для следующего шага."""
+def field_next(field, rule=LIFE):
+    """Преобразование поля для следующего шага по таблице правила."""
     new_field = deepcopy(field)
     for line,string in enumerate(field):
-        for pos in range(len(string)):
-            counter = count_lives(field,line,pos)
-            if counter < 2 or counter > 3:
-                new_field[line][pos] = False
-            elif counter == 3:
-                new_field[line][pos] = True
+        for pos,val in enumerate(string):
+            new_field[line][pos] = rule[9*bool(val) + count_lives(field,line,pos)]
     return new_field
 
 def count_lives(field,line,pos):
@@ -104,8 +208,465 @@ def count_lives(field,line,pos):
                 counter += 1
     return counter
 
-def main(stdscr):
-    """Главная функция игры Жизнь."""
+def padded_next(padded, table):
+    """Следующее поколение внутренней части массива с рамкой в одну клетку.
+
+    table - массив правила, индекс 9*state + count.
+    """
+    height, width = padded.shape[0]-2, padded.shape[1]-2
+    cells = padded[1:-1, 1:-1]
+    counter = np.zeros_like(cells)
+    for d_line in range(3):
+        for d_pos in range(3):
+            if d_line == 1 and d_pos == 1:
+                continue
+            counter += padded[d_line:d_line+height, d_pos:d_pos+width]
+    return table[9*cells + counter]
+
+def field_next_numpy(field, rule=LIFE):
+    """Векторизованный шаг поля: соседи считаются сдвигами всего массива."""
+    cells = np.asarray(field, dtype=np.uint8)
+    table = np.array(rule, dtype=np.uint8)
+    return padded_next(np.pad(cells, 1), table)  # нулевая рамка - края без зацикливания
+
+def array_changes(cells, new_cells, keys):
+    """Изменение популяции и XOR ключей изменившихся клеток массива."""
+    changed = new_cells != cells
+    born = int(np.count_nonzero(new_cells[changed]))
+    return (2*born - int(np.count_nonzero(changed)),
+            int(np.bitwise_xor.reduce(keys[changed])))
+
+def field_to_cells(field):
+    """Множество координат живых клеток поля."""
+    return {(line, pos)
+            for line, string in enumerate(field)
+            for pos, val in enumerate(string) if val}
+
+def cells_to_field(cells, height, width):
+    """Поле заданного размера из множества живых клеток."""
+    field = [[0]*width for i in range(height)]
+    for line, pos in cells:
+        if 0 <= line < height and 0 <= pos < width:
+            field[line][pos] = 1
+    return field
+
+def sparse_next(cells, shape=None, rule=LIFE):
+    """Шаг по множеству живых клеток, оцениваются только соседи живых.
+
+    shape - размер поля (height, width), None - бесконечное поле.
+    Правила с рождением при нуле соседей не поддерживаются.
+    """
+    counter = Counter()
+    for line, pos in cells:
+        for d_line in (-1, 0, 1):
+            for d_pos in (-1, 0, 1):
+                if d_line or d_pos:
+                    counter[(line+d_line, pos+d_pos)] += 1
+    new_cells = {cell for cell, count in counter.items()
+                 if rule[9*(cell in cells) + count]}
+    if rule[9]:  # Выживание без соседей
+        new_cells.update(cell for cell in cells if cell not in counter)
+    if shape is not None:
+        height, width = shape
+        new_cells = {(line, pos) for line, pos in new_cells
+                     if 0 <= line < height and 0 <= pos < width}
+    return new_cells
+
+MASK64 = (1 << 64) - 1
+
+def zobrist(line, pos):
+    """64-битный ключ Зобриста клетки (splitmix64 от координат)."""
+    value = ((line & 0xFFFFFFFF) << 32) | (pos & 0xFFFFFFFF)
+    value = (value + 0x9E3779B97F4A7C15) & MASK64
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & MASK64
+    return value ^ (value >> 31)
+
+def zobrist_table(height, width, top=0):
+    """Массив ключей zobrist для строк поля начиная с top."""
+    lines, poss = np.indices((height, width), dtype=np.uint64)
+    value = ((lines + np.uint64(top)) << np.uint64(32)) | poss
+    value = value + np.uint64(0x9E3779B97F4A7C15)
+    value = (value ^ (value >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    value = (value ^ (value >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return value ^ (value >> np.uint64(31))
+
+class CycleDetector:
+    """Поиск повтора состояния по хешу за последние history поколений."""
+
+    def __init__(self, history=1024):
+        self.history = history
+        self.seen = {}
+        self.order = deque()
+
+    def check(self, generation, state_hash):
+        """Период повтора состояния или None."""
+        previous = self.seen.get(state_hash)
+        if previous is not None:
+            return generation - previous
+        self.seen[state_hash] = generation
+        self.order.append(state_hash)
+        if len(self.order) > self.history:
+            del self.seen[self.order.popleft()]
+        return None
+
+def exact_period(life, span):
+    """Наименьший период состояния life, повторившегося через span поколений.
+
+    После перемотки повтор замечен только через span (кратное периоду)
+    поколений, период находится шагами по одному. Состояние движка
+    остается тем же, номер поколения растет на найденный период.
+    """
+    start = life.state_hash
+    for period in range(1, span + 1):
+        life.step()
+        if life.state_hash == start:
+            return period
+    return span
+
+class Engine:
+    """Движок поколений на чистом Python (эталон).
+
+    Популяция и хеш Зобриста состояния обновляются по изменившимся клеткам.
+    """
+
+    bounded = True
+
+    def __init__(self, field, rule=DEFAULT_RULE):
+        self.rule = compile_rule(rule)
+        self.generation = 0
+        self.population = 0
+        self.state_hash = 0
+        self.load(field)
+        self._toggle((line, pos, True) for line, pos in field_to_cells(field))
+
+    def _toggle(self, changes):
+        """Учет изменившихся клеток (line, pos, alive)."""
+        for line, pos, alive in changes:
+            self.population += 1 if alive else -1
+            self.state_hash ^= zobrist(line, pos)
+
+    def load(self, field):
+        """Загрузка поля."""
+        self.cells = [list(line) for line in field]
+        self.shape = (len(field), len(field[0]) if len(field) else 0)
+
+    def step(self):
+        """Переход к следующему поколению."""
+        new_cells = field_next(self.cells, self.rule)
+        self._toggle((line, pos, bool(new_cells[line][pos]))
+                     for line, string in enumerate(self.cells)
+                     for pos, val in enumerate(string)
+                     if bool(val) != bool(new_cells[line][pos]))
+        self.cells = new_cells
+        self.generation += 1
+
+    def advance(self, generations):
+        """Переход на generations поколений вперед."""
+        for _ in range(generations):
+            self.step()
+
+    def field(self):
+        """Поле для отрисовки."""
+        return self.cells
+
+    def is_live(self):
+        """Есть ли на поле живые клетки."""
+        return self.population > 0
+
+    def live_cells(self):
+        """Множество координат живых клеток."""
+        return field_to_cells(self.cells)
+
+    def save(self, path):
+        """Сохранение состояния в двоичный файл."""
+        save_checkpoint(path, self.live_cells(), self.generation,
+                        self.shape if self.bounded else None,
+                        rule_text(self.rule))
+
+    def close(self):
+        """Освобождение ресурсов движка."""
+
+class NumpyEngine(Engine):
+    """Движок поколений на массиве NumPy uint8."""
+
+    def load(self, field):
+        """Загрузка поля."""
+        self.cells = np.array(field, dtype=np.uint8)
+        self.shape = self.cells.shape
+        self.keys = zobrist_table(*self.shape)
+        self.table = np.array(self.rule, dtype=np.uint8)
+
+    def step(self):
+        """Переход к следующему поколению."""
+        new_cells = padded_next(np.pad(self.cells, 1), self.table)
+        delta, keys = array_changes(self.cells, new_cells, self.keys)
+        self.population += delta
+        self.state_hash ^= keys
+        self.cells = new_cells
+        self.generation += 1
+
+    def live_cells(self):
+        """Множество координат живых клеток."""
+        lines, poss = np.nonzero(self.cells)
+        return set(zip(lines.tolist(), poss.tolist()))
+
+_STRIPS = {}  # Разделяемые буферы и ключи полос в процессе-воркере
+
+def _strips_attach(names, shape, rule):
+    """Подключение воркера к разделяемым буферам поля."""
+    _STRIPS['table'] = np.array(rule, dtype=np.uint8)
+    _STRIPS['memory'] = [SharedMemory(name) for name in names]
+    _STRIPS['buffers'] = [np.ndarray(shape, np.uint8, memory.buf)
+                          for memory in _STRIPS['memory']]
+
+def _strip_step(task):
+    """Шаг полосы строк [start, end) буфера source в другой буфер.
+
+    Строки start-1 и end соседних полос служат гало и только читаются.
+    """
+    source, start, end = task
+    buffers = _STRIPS['buffers']
+    padded = buffers[source][start-1:end+1]
+    new_cells = padded_next(padded, _STRIPS['table'])
+    keys = _STRIPS.get((start, end))
+    if keys is None:
+        keys = zobrist_table(end - start, new_cells.shape[1], start - 1)
+        _STRIPS[(start, end)] = keys
+    changes = array_changes(padded[1:-1, 1:-1], new_cells, keys)
+    buffers[1-source][start:end, 1:-1] = new_cells
+    return changes
+
+def _strips_release(pool, memories):
+    """Остановка пула и удаление разделяемых буферов."""
+    pool.terminate()
+    pool.join()
+    for memory in memories:
+        memory.close()
+        memory.unlink()
+
+class ParallelEngine(NumpyEngine):
+    """Движок на пуле процессов: поле делится на полосы строк.
+
+    Поле с нулевой рамкой лежит в двух буферах разделяемой памяти, воркеры
+    пишут следующее поколение своей полосы во второй буфер, читая из первого
+    и граничные строки соседей. Процессы получают только номера строк.
+    """
+
+    workers = None  # Число процессов по умолчанию, None - по числу ядер
+
+    def __init__(self, field, rule=DEFAULT_RULE, workers=None):
+        self.workers = workers or ParallelEngine.workers or os.cpu_count() or 1
+        super().__init__(field, rule)
+
+    def load(self, field):
+        """Загрузка поля."""
+        cells = np.array(field, dtype=np.uint8)
+        self.shape = cells.shape
+        height, width = self.shape
+        padded_shape = (height + 2, width + 2)
+        self.memories = [
+            SharedMemory(create=True, size=padded_shape[0]*padded_shape[1])
+            for i in range(2)]
+        self.buffers = [np.ndarray(padded_shape, np.uint8, memory.buf)
+                        for memory in self.memories]
+        for buffer in self.buffers:
+            buffer[:] = 0
+        self.buffers[0][1:-1, 1:-1] = cells
+        self.source = 0
+        self.cells = self.buffers[0][1:-1, 1:-1]
+        bounds = np.linspace(1, height + 1, min(self.workers, height) + 1)
+        bounds = sorted(set(bounds.astype(int).tolist()))
+        self.strips = list(zip(bounds[:-1], bounds[1:]))
+        self.pool = Pool(self.workers, _strips_attach,
+                         ([memory.name for memory in self.memories],
+                          padded_shape, self.rule))
+        self._finalizer = weakref.finalize(
+            self, _strips_release, self.pool, self.memories)
+
+    def step(self):
+        """Переход к следующему поколению."""
+        for delta, keys in self.pool.map(
+                _strip_step,
+                [(self.source, start, end) for start, end in self.strips]):
+            self.population += delta
+            self.state_hash ^= keys
+        self.source = 1 - self.source
+        self.cells = self.buffers[self.source][1:-1, 1:-1]
+        self.generation += 1
+
+    def close(self):
+        """Остановка пула и освобождение разделяемой памяти."""
+        self.cells = self.cells.copy()
+        self.buffers = []
+        self._finalizer()
+
+class SparseEngine(Engine):
+    """Движок на множестве живых клеток, время шага зависит от популяции."""
+
+    def load(self, field):
+        """Загрузка поля."""
+        if self.rule[0]:
+            raise ValueError('sparse engines do not support B0 rules')
+        self.shape = (len(field), len(field[0]) if len(field) else 0)
+        self.cells = field_to_cells(field)
+
+    def _replace(self, new_cells):
+        """Замена множества клеток с учетом разницы."""
+        self._toggle((line, pos, True) for line, pos in new_cells - self.cells)
+        self._toggle((line, pos, False) for line, pos in self.cells - new_cells)
+        self.cells = new_cells
+
+    def step(self):
+        """Переход к следующему поколению."""
+        self._replace(sparse_next(
+            self.cells, self.shape if self.bounded else None, self.rule))
+        self.generation += 1
+
+    def field(self):
+        """Видимая часть поля для отрисовки."""
+        return cells_to_field(self.cells, *self.shape)
+
+    def live_cells(self):
+        """Множество координат живых клеток."""
+        return self.cells
+
+class InfiniteEngine(SparseEngine):
+    """Разреженный движок на бесконечном поле, экран - лишь окно в него."""
+
+    bounded = False
+
+class HashlifeEngine(InfiniteEngine):
+    """Hashlife на бесконечном поле, перемотка прыжками по 2**k поколений."""
+
+    def load(self, field):
+        """Загрузка поля."""
+        super().load(field)
+        self.life = HashLife(rule=self.rule)
+        self.node, self.origin = self.life.from_cells(self.cells)
+
+    def step(self):
+        """Переход к следующему поколению."""
+        self.advance(1)
+
+    def advance(self, generations):
+        """Переход на generations поколений вперед."""
+        self.node, self.origin = self.life.advance(
+            self.node, self.origin, generations)
+        self._replace(self.life.to_cells(self.node, self.origin))
+        self.generation += generations
+
+ENGINES = {'python': Engine, 'sparse': SparseEngine,
+           'infinite': InfiniteEngine, 'hashlife': HashlifeEngine}
+if np is not None:
+    ENGINES['numpy'] = NumpyEngine
+    ENGINES['parallel'] = ParallelEngine
+DEFAULT_ENGINE = 'numpy' if np is not None else 'python'
+FAST_FORWARD = 64  # Поколений на одно нажатие <F>
+MEMORY_GENERATIONS = 8  # Поколений в прогоне для замера памяти
+CHECKPOINT_FILE = 'live_game.chk'
+
+def autorun(stdscr, life, renderer, rate=0, fps=30):
+    """Автоматический прогон, поколения считает отдельный поток.
+
+    rate - целевая скорость в поколениях в секунду (0 - максимальная).
+    Экран обновляется не чаще fps раз в секунду и только при новом поколении,
+    промежуточные поколения пропускаются. Возвращает период повтора или None,
+    исключение потока симуляции поднимается снова в вызывающем потоке.
+    """
+    lock = Lock()
+    running = Event()
+    running.set()
+    step_once = Event()
+    stopped = Event()
+    result = {'period': None, 'error': None}
+
+    def simulation():
+        try:
+            detector = CycleDetector()
+            detector.check(life.generation, life.state_hash)
+            moment = perf_counter()
+            while not stopped.is_set():
+                if not running.is_set():
+                    if not step_once.wait(0.05):
+                        continue
+                    step_once.clear()
+                    moment = perf_counter()
+                with lock:
+                    life.step()
+                    period = detector.check(life.generation, life.state_hash)
+                if period or not life.is_live():
+                    result['period'] = period
+                    stopped.set()
+                elif rate:
+                    moment += 1/rate
+                    delay = moment - perf_counter()
+                    if delay > 0:
+                        stopped.wait(delay)  # Выход не ждет конца периода
+                    else:
+                        moment = perf_counter()  # Отставание не копим
+        except BaseException as error:  # Передаем в главный поток
+            result['error'] = error
+        finally:
+            stopped.set()
+
+    thread = Thread(target=simulation, daemon=True)
+    thread.start()
+    stdscr.nodelay(True)
+    shown = None
+    frames = 0
+    mark_time = perf_counter()
+    mark_generation = life.generation
+    gen_rate = frame_rate = 0.0
+    while not stopped.is_set():
+        frame_start = perf_counter()
+        key = stdscr.getch()
+        if key in (ord('q'), ord('Q')):
+            stopped.set()
+            break
+        if key in (ord('p'), ord('P'), ord(' ')):
+            if running.is_set():
+                running.clear()
+            else:
+                running.set()
+        elif key in (ord('n'), ord('N')):
+            step_once.set()
+        with lock:
+            generation = life.generation
+            field = None
+            if generation != shown:
+                field = [list(line) for line in life.field()]
+        if field is not None:
+            renderer.draw(field)
+            shown = generation
+            frames += 1
+        now = perf_counter()
+        if now - mark_time >= 1:
+            gen_rate = (generation - mark_generation)/(now - mark_time)
+            frame_rate = frames/(now - mark_time)
+            mark_time, mark_generation, frames = now, generation, 0
+        state = '' if running.is_set() else ' ПАУЗА'
+        stdscr.addstr(0, 0, f'{generation} пок. {gen_rate:.0f} пок/с '
+                            f'{frame_rate:.0f} к/с{state}'.ljust(40))
+        stdscr.refresh()
+        sleep(max(0.0, 1/fps - (perf_counter() - frame_start)))
+    thread.join()
+    stdscr.nodelay(False)
+    if result['error'] is not None:
+        raise result['error']
+    renderer.draw(life.field())
+    stdscr.refresh()
+    return result['period']
+
+def main(stdscr, engine=DEFAULT_ENGINE, cells=None, rule=DEFAULT_RULE,
+         rate=None, fps=30, generation=0, shape=None):
+    """Главная функция игры Жизнь, cells - начальный образец.
+
+    rate - скорость автоматического режима в поколениях в секунду,
+    None - ручной режим с шагом по нажатию клавиши. Клетки ставятся на поле
+    экрана через place_cells с размером shape, первая жизнь продолжает
+    счет поколений с generation (восстановленное состояние).
+    """
     stdscr.clear()
     curses.curs_set(0)
     curses.init_pair(1, curses.COLOR_GREEN, curses.COLOR_GREEN)
@@ -115,18 +676,219 @@ def main(stdscr):
     stdscr.addstr(greating())
     stdscr.getkey()
 
+    renderer = FieldRenderer(stdscr)
+    if cells:
+        cells = place_cells(cells, *field_size(stdscr), shape)
     while True:
-        field = init(stdscr)
-        while field_is_live(field):
-            field_print(stdscr,field)
+        life = ENGINES[engine](init(stdscr, renderer, cells), rule)
+        life.generation, generation = generation, 0
+        detector = CycleDetector()
+        period = None
+        if rate is not None:
+            period = autorun(stdscr, life, renderer, rate, fps)
+        while rate is None and life.is_live():
+            renderer.draw(life.field())
             stdscr.refresh()
+            period = detector.check(life.generation, life.state_hash)
+            if period:
+                period = exact_period(life, period)
+                break
             key = stdscr.getkey()
             if key.upper() == 'Q':
                 break
-            field = field_next(field)
+            if key.upper() == 'W':
+                life.save(CHECKPOINT_FILE)
+                continue
+            if key.upper() == 'F':
+                life.advance(FAST_FORWARD)
+            else:
+                life.step()
+        life.close()
 
-        if finish(stdscr):
+        if finish(stdscr, period):
             break
 
+def random_field(height, width, density=0.35, seed=0):
+    """Случайное поле с заданной плотностью живых клеток."""
+    rnd = random.Random(seed)
+    return [[int(rnd.random() < density) for i in range(width)]
+            for j in range(height)]
+
+def peak_memory(engine, field, generations, rule=DEFAULT_RULE):
+    """Пик памяти Python в KiB: движок с полем и generations поколений.
+
+    Замер идет отдельным прогоном под tracemalloc, который замедляет
+    движки в разы и потому не смешивается с замером скорости. Память
+    процессов-воркеров и разделяемых буферов не учитывается.
+    """
+    tracemalloc.start()
+    try:
+        life = ENGINES[engine](field, rule)
+        life.advance(generations)
+        life.close()
+        return tracemalloc.get_traced_memory()[1]//1024
+    finally:
+        tracemalloc.stop()
+
+def simulate(engine, field, generations, detect=False, rule=DEFAULT_RULE):
+    """Прогон без экрана, возвращает статистику скорости и памяти.
+
+    При detect прогон останавливается на первом повторе состояния.
+    """
+    life = ENGINES[engine](field, rule)
+    stats = measure(life, generations, detect)
+    stats['engine'] = engine
+    life.close()
+    stats['peak_kib'] = peak_memory(
+        engine, field, min(generations, MEMORY_GENERATIONS), rule)
+    return stats
+
+def measure(life, generations, detect=False):
+    """Прогон готового движка на generations поколений со статистикой.
+
+    Память не замеряется (peak_kib - None), ее считает peak_memory.
+    """
+    first = life.generation
+    period = None
+    start = perf_counter()
+    if detect:
+        detector = CycleDetector()
+        detector.check(life.generation, life.state_hash)
+        while life.generation - first < generations and life.is_live():
+            life.step()
+            period = detector.check(life.generation, life.state_hash)
+            if period:
+                break
+        generations = life.generation - first
+    else:
+        life.advance(generations)
+    seconds = perf_counter() - start
+    height, width = life.shape
+    rate = generations/seconds if seconds else float('inf')
+    return {
+        'engine': type(life).__name__,
+        'rule': rule_text(life.rule),
+        'height': height,
+        'width': width,
+        'generations': generations,
+        'seconds': seconds,
+        'gen_per_sec': rate,
+        'cells_per_sec': rate*height*width,
+        'peak_kib': None,
+        'population': life.population,
+        'period': period,
+    }
+
+def format_stats(stats):
+    """Строка со статистикой прогона."""
+    return (f"{stats['engine']:>8} {stats['rule']} "
+            f"{stats['height']}x{stats['width']} "
+            f"{stats['generations']} gen in {stats['seconds']:.3f}s: "
+            f"{stats['gen_per_sec']:.1f} gen/s, "
+            f"{stats['cells_per_sec']:.3g} cells/s, "
+            + (f"peak {stats['peak_kib']} KiB, "
+               if stats['peak_kib'] is not None else '')
+            + f"population {stats['population']}"
+            + (f", period {stats['period']}" if stats['period'] else ''))
+
+def create_parser():
+    """Create parser."""
+    parser = argparse.ArgumentParser(
+        description='Игра Жизнь.',
+        epilog='@2022 Sany Tcheren.'
+    )
+    parser.add_argument('-e', '--engine', choices=sorted(ENGINES),
+                        default=DEFAULT_ENGINE, help='generation engine')
+    parser.add_argument('-a', '--auto', type=float, metavar='RATE',
+                        help='run automatically at RATE generations/s '
+                             '(0 - as fast as possible)')
+    parser.add_argument('--fps', type=int, default=30,
+                        help='frame rate cap of automatic mode')
+    parser.add_argument('--headless', action='store_true',
+                        help='run without screen and print statistics')
+    parser.add_argument('-n', '--generations', type=int, default=100,
+                        help='generations for headless run')
+    parser.add_argument('-s', '--size', type=int, nargs=2, default=[64, 64],
+                        metavar=('HEIGHT', 'WIDTH'),
+                        help='field size for headless run')
+    parser.add_argument('-d', '--density', type=float, default=0.35,
+                        help='density of random field')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed of random field')
+    parser.add_argument('--stop-on-cycle', action='store_true',
+                        help='stop headless run on repeated state')
+    parser.add_argument('-r', '--rule',
+                        help='rule in B/S notation, e.g. B36/S23 '
+                             '(default: rule of pattern or checkpoint, or B3/S23)')
+    parser.add_argument('-j', '--workers', type=int,
+                        help='processes of parallel engine')
+    parser.add_argument('-p', '--pattern',
+                        help='start pattern (.rle, .cells, .lif)')
+    parser.add_argument('--restore', help='restore state from checkpoint')
+    parser.add_argument('--save',
+                        help='save final pattern (.rle, .cells, .lif) '
+                             'or checkpoint (.chk) after headless run')
+    return parser
+
+def start_cells(args, screen=False):
+    """Начальные клетки, номер поколения, размер поля и правило по аргументам.
+
+    При screen поле задает экран: образец не сдвигается, а размер поля
+    состояния возвращается как есть (для place_cells).
+    """
+    height, width = args.size
+    rule = args.rule or DEFAULT_RULE
+    if args.restore:
+        cells, generation, shape, saved_rule = load_checkpoint(args.restore)
+        if shape is None and not screen:  # Бесконечное поле: в центр --size
+            cells, shape = centre_cells(cells, height, width), (height, width)
+        return cells, generation, shape, args.rule or saved_rule or rule
+    if args.pattern:
+        cells, pattern_rule = load_pattern(args.pattern)
+        if not screen:
+            cells = centre_cells(cells, height, width)
+        return (cells, 0, None if screen else (height, width),
+                args.rule or pattern_rule or DEFAULT_RULE)
+    return None, 0, None if screen else (height, width), rule
+
+def headless(args, start=None):
+    """Прогон без экрана по аргументам командной строки.
+
+    start - уже прочитанный результат start_cells(args).
+    """
+    cells, generation, (height, width), rule = start or start_cells(args)
+    if cells is None:
+        field = random_field(height, width, args.density, args.seed)
+    else:
+        field = cells_to_field(cells, height, width)
+    life = ENGINES[args.engine](field, rule)
+    life.generation = generation
+    stats = measure(life, args.generations, args.stop_on_cycle)
+    stats['engine'] = args.engine
+    stats['peak_kib'] = peak_memory(
+        args.engine, field, min(stats['generations'], MEMORY_GENERATIONS),
+        rule)
+    print(format_stats(stats))
+    if args.save:
+        if args.save.endswith('.chk'):
+            life.save(args.save)
+        else:
+            save_pattern(args.save, life.live_cells(), rule_text(life.rule))
+    life.close()
+
 if __name__ == '__main__':
-    curses.wrapper(main)
+    my_parser = create_parser()
+    my_args = my_parser.parse_args()
+    ParallelEngine.workers = my_args.workers
+    try:
+        compile_rule(my_args.rule or DEFAULT_RULE)
+        my_start = start_cells(my_args, not my_args.headless)
+        compile_rule(my_start[3])  # Правило из файла образца
+    except (OSError, ValueError) as error:
+        my_parser.error(str(error))
+    if my_args.headless:
+        headless(my_args, my_start)
+    else:
+        my_cells, my_generation, my_shape, my_rule = my_start
+        curses.wrapper(main, my_args.engine, my_cells, my_rule,
+                       my_args.auto, my_args.fps, my_generation, my_shape)
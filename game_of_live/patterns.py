@@ -0,0 +1,260 @@
+"""Загрузка и сохранение образцов игры Жизнь.
+
+Поддерживаются RLE, plaintext (.cells) и Life 1.06. Файлы читаются через
+mmap, разбор идет регулярными выражениями прямо по буферу, живые клетки
+сразу попадают в множество координат (line, pos).
+"""
+import mmap
+import os
+import re
+import struct
+
+from rules import DEFAULT_RULE
+
+RLE_TOKEN = re.compile(rb'(?m)^(#[^\n]*|x\s*=[^\n]*)|(\d*)([a-zA-Z.$!])')
+RLE_RULE = re.compile(rb'rule\s*=\s*([^\s,]+)')
+PLAINTEXT_TOKEN = re.compile(rb'(?m)^![^\n]*\n?|\n|[O*]')
+LIFE106_TOKEN = re.compile(rb'(?m)^#[^\n]*|(-?\d+)[ \t]+(-?\d+)')
+
+CHECKPOINT_MAGIC = b'LIFE'
+CHECKPOINT_VERSION = 2
+CHECKPOINT_HEADER = struct.Struct('<4sBQIIqqII')
+CHECKPOINT_RULE = struct.Struct('<B')  # Длина правила, с версии 2
+
+
+def read_rle(data):
+    """Живые клетки и правило из RLE."""
+    cells = set()
+    rule = None
+    line = pos = 0
+    for match in RLE_TOKEN.finditer(data):
+        header, count, tag = match.groups()
+        if header is not None:
+            if header.startswith(b'x'):
+                found = RLE_RULE.search(header)
+                if found:
+                    rule = found.group(1).decode()
+            continue
+        count = int(count) if count else 1
+        if tag == b'!':
+            break
+        if tag == b'$':
+            line += count
+            pos = 0
+        elif tag in b'b.':
+            pos += count
+        else:
+            cells.update((line, pos + i) for i in range(count))
+            pos += count
+    return cells, rule
+
+
+def read_plaintext(data):
+    """Живые клетки из plaintext (.cells)."""
+    cells = set()
+    line = 0
+    line_start = 0
+    for match in PLAINTEXT_TOKEN.finditer(data):
+        token = match.group()
+        if token.startswith(b'!'):
+            line_start = match.end()
+        elif token == b'\n':
+            line += 1
+            line_start = match.end()
+        else:
+            cells.add((line, match.start() - line_start))
+    return cells
+
+
+def read_life106(data):
+    """Живые клетки из Life 1.06 (пары x y)."""
+    return {(int(y), int(x))
+            for x, y in (match.groups()
+                         for match in LIFE106_TOKEN.finditer(data))
+            if x is not None}
+
+
+def _bounds(cells):
+    """Левый верхний угол и размер прямоугольника с клетками."""
+    if not cells:
+        return 0, 0, 0, 0
+    top = min(line for line, _ in cells)
+    left = min(pos for _, pos in cells)
+    height = max(line for line, _ in cells) - top + 1
+    width = max(pos for _, pos in cells) - left + 1
+    return top, left, height, width
+
+
+def _rows(cells):
+    """Строки образца: для каждой строки отсортированные позиции."""
+    top, left, height, _ = _bounds(cells)
+    rows = [[] for i in range(height)]
+    for line, pos in cells:
+        rows[line - top].append(pos - left)
+    for row in rows:
+        row.sort()
+    return rows
+
+
+def write_rle(cells, rule=DEFAULT_RULE):
+    """Текст RLE для множества клеток."""
+    _, _, height, width = _bounds(cells)
+    tokens = []
+    blank = 0
+    for row in _rows(cells):
+        if not row:
+            blank += 1
+            continue
+        if tokens:
+            tokens.append(f'{blank + 1 if blank else ""}$')
+        blank = 0
+        pos = 0
+        run_start = None
+        for cell in row + [None]:
+            if run_start is not None and cell != pos:
+                run = pos - run_start
+                tokens.append(f'{run if run > 1 else ""}o')
+                run_start = None
+            if cell is None:
+                break
+            if run_start is None:
+                if cell > pos:
+                    gap = cell - pos
+                    tokens.append(f'{gap if gap > 1 else ""}b')
+                run_start = cell
+            pos = cell + 1
+    tokens.append('!')
+    lines = [f'x = {width}, y = {height}, rule = {rule}']
+    current = ''
+    for token in tokens:
+        if len(current) + len(token) > 70:
+            lines.append(current)
+            current = ''
+        current += token
+    lines.append(current)
+    return '\n'.join(lines) + '\n'
+
+
+def write_plaintext(cells, name=None):
+    """Текст plaintext (.cells) для множества клеток."""
+    _, _, _, width = _bounds(cells)
+    lines = [f'!Name: {name}'] if name else []
+    for row in _rows(cells):
+        line = ['.'] * width
+        for pos in row:
+            line[pos] = 'O'
+        lines.append(''.join(line).rstrip('.'))
+    return '\n'.join(lines) + '\n'
+
+
+def write_life106(cells):
+    """Текст Life 1.06 для множества клеток."""
+    lines = ['#Life 1.06']
+    lines.extend(f'{pos} {line}' for line, pos in sorted(cells))
+    return '\n'.join(lines) + '\n'
+
+
+READERS = {'.rle': 'rle', '.cells': 'plaintext',
+           '.lif': 'life106', '.life': 'life106'}
+
+
+def _format(path, data):
+    """Формат файла по расширению или первым байтам."""
+    kind = READERS.get(os.path.splitext(path)[1].lower())
+    if kind is None:
+        if data[:10] == b'#Life 1.06':
+            kind = 'life106'
+        elif data[:1] in (b'!', b'.', b'O'):
+            kind = 'plaintext'
+        else:
+            kind = 'rle'
+    return kind
+
+
+def load_pattern(path):
+    """Живые клетки и правило (или None) из файла образца."""
+    with open(path, 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return set(), None
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            kind = _format(path, data)
+            if kind == 'rle':
+                return read_rle(data)
+            if kind == 'plaintext':
+                return read_plaintext(data), None
+            return read_life106(data), None
+
+
+def save_pattern(path, cells, rule=DEFAULT_RULE):
+    """Сохранение клеток в формате по расширению файла (по умолчанию RLE)."""
+    kind = READERS.get(os.path.splitext(path)[1].lower(), 'rle')
+    if kind == 'plaintext':
+        text = write_plaintext(cells, os.path.basename(path))
+    elif kind == 'life106':
+        text = write_life106(cells)
+    else:
+        text = write_rle(cells, rule)
+    with open(path, 'w') as file:
+        file.write(text)
+
+
+def centre_cells(cells, height, width):
+    """Сдвиг образца в центр поля height x width."""
+    top, left, rows, cols = _bounds(cells)
+    d_line = (height - rows)//2 - top
+    d_pos = (width - cols)//2 - left
+    return {(line + d_line, pos + d_pos) for line, pos in cells}
+
+
+def save_checkpoint(path, cells, generation, shape=None, rule=DEFAULT_RULE):
+    """Сохранение состояния: заголовок, правило и битовая карта.
+
+    shape - размер поля (height, width), None - бесконечное поле.
+    """
+    top, left, rows, cols = _bounds(cells)
+    bits = bytearray((rows*cols + 7)//8)
+    for line, pos in cells:
+        index = (line - top)*cols + pos - left
+        bits[index >> 3] |= 0x80 >> (index & 7)
+    height, width = shape if shape is not None else (0, 0)
+    rule = rule.encode('ascii')
+    with open(path, 'wb') as file:
+        file.write(CHECKPOINT_HEADER.pack(
+            CHECKPOINT_MAGIC, CHECKPOINT_VERSION, generation,
+            height, width, top, left, rows, cols))
+        file.write(CHECKPOINT_RULE.pack(len(rule)) + rule)
+        file.write(bits)
+
+
+def load_checkpoint(path):
+    """Клетки, номер поколения, размер поля и правило из файла состояния.
+
+    Размер поля None - бесконечное поле, правило None - файл версии 1
+    без правила.
+    """
+    with open(path, 'rb') as file:
+        header = file.read(CHECKPOINT_HEADER.size)
+        if len(header) < CHECKPOINT_HEADER.size:
+            raise ValueError(f'{path}: truncated checkpoint')
+        (magic, version, generation, height, width,
+         top, left, rows, cols) = CHECKPOINT_HEADER.unpack(header)
+        if magic != CHECKPOINT_MAGIC or version not in (1, CHECKPOINT_VERSION):
+            raise ValueError(f'{path}: not a checkpoint')
+        rule = None
+        if version > 1:
+            size = file.read(CHECKPOINT_RULE.size)
+            if len(size) < CHECKPOINT_RULE.size:
+                raise ValueError(f'{path}: truncated checkpoint')
+            rule = file.read(CHECKPOINT_RULE.unpack(size)[0]).decode('ascii')
+        bits = file.read()
+    if len(bits) < (rows*cols + 7)//8:
+        raise ValueError(f'{path}: truncated checkpoint')
+    cells = set()
+    for offset, byte in enumerate(bits):
+        while byte:
+            bit = byte.bit_length() - 1
+            byte ^= 1 << bit
+            index = offset*8 + 7 - bit
+            cells.add((top + index//cols, left + index % cols))
+    shape = (height, width) if height or width else None
+    return cells, generation, shape, rule
@@ -0,0 +1,37 @@
+"""Правила игры Жизнь в нотации B/S."""
+import re
+
+RULE_PATTERN = re.compile(
+    r'^(?:B([0-8]*)/S([0-8]*)|S([0-8]*)/B([0-8]*)|([0-8]*)/([0-8]*))'
+    r'(?::\S*)?$', re.IGNORECASE)
+DEFAULT_RULE = 'B3/S23'
+
+
+def compile_rule(text):
+    """Таблица правила: элемент 9*state + count - следующее состояние клетки.
+
+    text - правило вида B36/S23 (порядок B и S любой) или 23/36 (выживание
+    и рождение цифрами). Суффикс ограниченного поля (:P64,64 в RLE)
+    отбрасывается, размер поля задается отдельно.
+    """
+    match = RULE_PATTERN.match(text.strip())
+    if match is None:
+        raise ValueError(f'bad rule {text!r}, expected B.../S...')
+    if match.group(1) is not None:
+        birth, survive = match.group(1), match.group(2)
+    elif match.group(3) is not None:
+        survive, birth = match.group(3), match.group(4)
+    else:
+        survive, birth = match.group(5), match.group(6)
+    return tuple(int(str(count) in birth) for count in range(9)) + tuple(
+        int(str(count) in survive) for count in range(9))
+
+
+def rule_text(table):
+    """Каноническая запись правила по таблице."""
+    birth = ''.join(str(count) for count in range(9) if table[count])
+    survive = ''.join(str(count) for count in range(9) if table[9 + count])
+    return f'B{birth}/S{survive}'
+
+
+LIFE = compile_rule(DEFAULT_RULE)
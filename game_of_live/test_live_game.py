@@ -0,0 +1,430 @@
+"""Tests for live_game."""
+
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+from time import perf_counter
+import live_game as lg
+import patterns
+import rules
+
+
+def random_field(height, width, seed):
+    return lg.random_field(height, width, seed=seed)
+
+
+class TestEngines(unittest.TestCase):
+
+    def test_count_lives_edges(self):
+        field = [[1, 1, 1],
+                 [1, 0, 1],
+                 [1, 1, 1]]
+        self.assertEqual(lg.count_lives(field, 1, 1), 8)
+        self.assertEqual(lg.count_lives(field, 0, 0), 2)
+        self.assertEqual(lg.count_lives(field, 0, 1), 4)
+
+    @unittest.skipIf(lg.np is None, 'numpy is not installed')
+    def test_numpy_matches_python(self):
+        for seed, (height, width) in enumerate([(1, 1), (1, 7), (5, 1),
+                                                (8, 8), (13, 21)]):
+            reference = lg.Engine(random_field(height, width, seed))
+            fast = lg.NumpyEngine(random_field(height, width, seed))
+            for _ in range(10):
+                reference.step()
+                fast.step()
+                self.assertEqual(
+                    [[bool(val) for val in line] for line in reference.field()],
+                    fast.field().astype(bool).tolist())
+                self.assertEqual(reference.is_live(), fast.is_live())
+
+    def test_sparse_matches_python(self):
+        for seed, (height, width) in enumerate([(1, 1), (6, 9), (13, 21)]):
+            reference = lg.Engine(random_field(height, width, seed))
+            sparse = lg.SparseEngine(random_field(height, width, seed))
+            for _ in range(10):
+                reference.step()
+                sparse.step()
+                self.assertEqual(
+                    lg.field_to_cells(reference.field()), sparse.cells)
+                self.assertEqual(reference.is_live(), sparse.is_live())
+
+    @unittest.skipIf(lg.np is None, 'numpy is not installed')
+    def test_parallel_matches_numpy(self):
+        for workers in (1, 3):
+            field = random_field(23, 17, workers)
+            serial = lg.NumpyEngine(field)
+            parallel = lg.ParallelEngine(field, workers=workers)
+            try:
+                for _ in range(6):
+                    serial.step()
+                    parallel.step()
+                    self.assertTrue((serial.field() == parallel.field()).all())
+                    self.assertEqual(serial.population, parallel.population)
+                    self.assertEqual(serial.state_hash, parallel.state_hash)
+            finally:
+                parallel.close()
+
+    def test_infinite_glider_leaves_screen(self):
+        glider = [[0, 1, 0, 0],
+                  [0, 0, 1, 0],
+                  [1, 1, 1, 0],
+                  [0, 0, 0, 0]]
+        life = lg.InfiniteEngine(glider)
+        for _ in range(40):
+            life.step()
+        self.assertEqual(len(life.cells), 5)
+        self.assertEqual(min(life.cells), (10, 11))
+        self.assertFalse(lg.field_is_live(life.field()))
+
+    def test_hashlife_matches_infinite(self):
+        field = random_field(12, 12, 7)
+        reference = lg.InfiniteEngine(field)
+        hashlife = lg.HashlifeEngine(field)
+        for generations in (1, 1, 2, 5, 8, 13, 64):
+            reference.advance(generations)
+            hashlife.advance(generations)
+            self.assertEqual(reference.cells, hashlife.cells)
+
+    def test_hashlife_small_cache(self):
+        field = random_field(10, 10, 3)
+        reference = lg.InfiniteEngine(field)
+        hashlife = lg.HashlifeEngine(field)
+        hashlife.life.max_cache = 64
+        for _ in range(4):
+            reference.advance(25)
+            hashlife.advance(25)
+            self.assertEqual(reference.cells, hashlife.cells)
+        # Equal subtrees must stay one object after the tables shrink
+        life, node = hashlife.life, hashlife.node
+        self.assertIs(life.join(node.nw, node.ne, node.sw, node.se), node)
+        self.assertIs(life.from_cells(hashlife.cells)[0],
+                      life.from_cells(hashlife.cells)[0])
+
+    def test_simulate(self):
+        stats = lg.simulate('sparse', random_field(16, 24, 1), 5)
+        self.assertEqual((stats['height'], stats['width']), (16, 24))
+        self.assertEqual(stats['generations'], 5)
+        self.assertAlmostEqual(stats['cells_per_sec'],
+                               stats['gen_per_sec']*16*24)
+        small = lg.simulate('sparse', random_field(16, 24, 1), 2)
+        big = lg.simulate('sparse', random_field(160, 240, 1), 2)
+        self.assertGreater(big['peak_kib'], small['peak_kib'])
+
+
+class TestCycles(unittest.TestCase):
+
+    def test_zobrist_table_matches_scalar(self):
+        if lg.np is None:
+            self.skipTest('numpy is not installed')
+        table = lg.zobrist_table(5, 7)
+        for line in range(5):
+            for pos in range(7):
+                self.assertEqual(int(table[line, pos]), lg.zobrist(line, pos))
+
+    def test_hash_and_population_agree(self):
+        field = random_field(12, 15, 4)
+        engines = [engine(field) for engine in lg.ENGINES.values()
+                   if engine is not lg.InfiniteEngine
+                   and engine is not lg.HashlifeEngine]
+        for _ in range(8):
+            for life in engines:
+                life.step()
+                self.assertEqual(
+                    life.population,
+                    sum(map(bool, sum(map(list, life.field()), []))))
+            self.assertEqual(len({life.state_hash for life in engines}), 1)
+        for life in engines:
+            life.close()
+
+    def test_periods(self):
+        block = [[0, 0, 0, 0], [0, 1, 1, 0], [0, 1, 1, 0], [0, 0, 0, 0]]
+        blinker = [[0, 0, 0], [1, 1, 1], [0, 0, 0]]
+        for engine in lg.ENGINES:
+            self.assertEqual(
+                lg.simulate(engine, block, 100, detect=True)['period'], 1)
+            stats = lg.simulate(engine, blinker, 100, detect=True)
+            self.assertEqual((stats['period'], stats['generations']), (2, 2))
+            stats = lg.simulate(engine, [[1, 0], [0, 0]], 100, detect=True)
+            self.assertEqual((stats['period'], stats['population']), (None, 0))
+
+    def test_period_after_fast_forward(self):
+        life = lg.Engine([[0, 0, 0], [1, 1, 1], [0, 0, 0]])
+        detector = lg.CycleDetector()
+        detector.check(life.generation, life.state_hash)
+        life.advance(lg.FAST_FORWARD)
+        span = detector.check(life.generation, life.state_hash)
+        self.assertEqual(span, lg.FAST_FORWARD)
+        cells = life.live_cells()
+        self.assertEqual(lg.exact_period(life, span), 2)
+        self.assertEqual(life.live_cells(), cells)
+
+
+class TestRules(unittest.TestCase):
+
+    def test_compile_rule(self):
+        self.assertEqual(rules.LIFE[:9], (0, 0, 0, 1, 0, 0, 0, 0, 0))
+        self.assertEqual(rules.LIFE[9:], (0, 0, 1, 1, 0, 0, 0, 0, 0))
+        self.assertEqual(rules.compile_rule('s23/b36'),
+                         rules.compile_rule('B36/S23'))
+        self.assertEqual(rules.rule_text(rules.compile_rule('B2/S')), 'B2/S')
+        self.assertEqual(rules.compile_rule('23/3'), rules.LIFE)
+        self.assertEqual(rules.compile_rule('B3/S23:P64,64'), rules.LIFE)
+        for text in ('B9/S23', '23/3/1', 'B3S23', ''):
+            with self.assertRaises(ValueError):
+                rules.compile_rule(text)
+
+    def test_engines_agree_on_rules(self):
+        for rule in ('B36/S23', 'B2/S', 'B3/S012345678'):
+            field = random_field(14, 11, len(rule))
+            reference = lg.Engine(field, rule)
+            others = [engine(field, rule) for name, engine in lg.ENGINES.items()
+                      if name not in ('python', 'infinite', 'hashlife')]
+            for _ in range(6):
+                reference.step()
+                for life in others:
+                    life.step()
+                    self.assertEqual(life.live_cells(), reference.live_cells())
+                    self.assertEqual(life.state_hash, reference.state_hash)
+            for life in others:
+                life.close()
+
+    def test_hashlife_rule(self):
+        field = random_field(10, 10, 9)
+        reference = lg.InfiniteEngine(field, 'B36/S23')
+        hashlife = lg.HashlifeEngine(field, 'B36/S23')
+        reference.advance(37)
+        hashlife.advance(37)
+        self.assertEqual(reference.cells, hashlife.cells)
+
+    def test_b0_rejected_by_sparse(self):
+        with self.assertRaises(ValueError):
+            lg.SparseEngine([[0]], 'B0/S')
+        life = lg.Engine([[0, 0], [0, 0]], 'B0/S')
+        life.step()
+        self.assertEqual(life.population, 4)
+
+
+GOSPER_GUN_RLE = b"""#N Gosper glider gun
+x = 36, y = 9, rule = B3/S23
+24bo$22bobo$12b2o6b2o12b2o$11bo3bo4b2o12b2o$2o8bo5bo3b2o$2o8bo3bob2o4b
+obo$10bo5bo7bo$11bo3bo$12b2o!
+"""
+
+
+class TestPatterns(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.tmp.name, name)
+
+    def test_read_rle(self):
+        cells, rule = patterns.read_rle(GOSPER_GUN_RLE)
+        self.assertEqual(rule, 'B3/S23')
+        self.assertEqual(len(cells), 36)
+        self.assertIn((0, 24), cells)
+        self.assertIn((4, 0), cells)
+
+    def test_read_plaintext_and_life106(self):
+        glider = {(0, 1), (1, 2), (2, 0), (2, 1), (2, 2)}
+        self.assertEqual(
+            patterns.read_plaintext(b'!Name: Glider\n.O\n..O\nOOO\n'),
+            glider)
+        self.assertEqual(
+            patterns.read_life106(b'#Life 1.06\n1 0\n2 1\n0 2\n1 2\n2 2\n'),
+            glider)
+
+    def test_rle_rule_forms(self):
+        for header in (b'rule = 23/3', b'rule = B3/S23:P64,64'):
+            with open(self.path('gun.rle'), 'wb') as file:
+                file.write(GOSPER_GUN_RLE.replace(b'rule = B3/S23', header))
+            args = lg.create_parser().parse_args(
+                ['-p', self.path('gun.rle')])
+            rule = lg.start_cells(args)[3]
+            self.assertEqual(rules.compile_rule(rule), rules.LIFE)
+
+    def test_round_trip(self):
+        cells, _ = patterns.read_rle(GOSPER_GUN_RLE)
+        for name in ('gun.rle', 'gun.cells', 'gun.lif'):
+            patterns.save_pattern(self.path(name), cells)
+            self.assertEqual(patterns.load_pattern(self.path(name))[0], cells)
+
+    def test_checkpoint(self):
+        life = lg.SparseEngine(random_field(9, 13, 5))
+        life.advance(3)
+        life.save(self.path('life.chk'))
+        cells, generation, shape, rule = patterns.load_checkpoint(
+            self.path('life.chk'))
+        self.assertEqual((cells, generation, shape, rule),
+                         (life.cells, 3, (9, 13), 'B3/S23'))
+        self.assertEqual(os.path.getsize(self.path('life.chk')),
+                         patterns.CHECKPOINT_HEADER.size + 7 + 15)
+
+    def test_checkpoint_keeps_rule(self):
+        field = random_field(16, 16, 2)
+        life = lg.SparseEngine(field, 'B36/S23')
+        life.advance(5)
+        life.save(self.path('life.chk'))
+        args = lg.create_parser().parse_args(
+            ['-s', '16', '16', '--restore', self.path('life.chk')])
+        cells, generation, (height, width), rule = lg.start_cells(args)
+        self.assertEqual(rule, 'B36/S23')
+        restored = lg.SparseEngine(lg.cells_to_field(cells, height, width),
+                                   rule)
+        life.advance(10)
+        restored.advance(10)
+        self.assertEqual(restored.cells, life.cells)
+        args = lg.create_parser().parse_args(
+            ['-r', 'B3/S23', '--restore', self.path('life.chk')])
+        self.assertEqual(lg.start_cells(args)[3], 'B3/S23')
+
+    def test_unbounded_restore(self):
+        glider = {(0, 1), (1, 2), (2, 0), (2, 1), (2, 2)}
+        for engine in ('infinite', 'hashlife'):
+            life = lg.ENGINES[engine](lg.cells_to_field(glider, 10, 10))
+            life.advance(40)
+            life.save(self.path('life.chk'))
+            args = lg.create_parser().parse_args(
+                ['--headless', '-n', '0', '-s', '10', '10',
+                 '--restore', self.path('life.chk'),
+                 '--save', self.path('life.rle')])
+            cells, generation, shape, _ = lg.start_cells(args)
+            self.assertEqual((generation, shape), (40, (10, 10)))
+            self.assertEqual(cells, lg.centre_cells(life.live_cells(), 10, 10))
+            with contextlib.redirect_stdout(io.StringIO()):
+                lg.headless(args)
+            self.assertEqual(
+                lg.centre_cells(patterns.load_pattern(
+                    self.path('life.rle'))[0], 10, 10), cells)
+
+    def test_screen_start(self):
+        patterns.save_pattern(self.path('glider.cells'),
+                              {(0, 1), (1, 2), (2, 0), (2, 1), (2, 2)})
+        args = lg.create_parser().parse_args(
+            ['-p', self.path('glider.cells')])
+        cells, generation, shape, _ = lg.start_cells(args, screen=True)
+        self.assertEqual((generation, shape), (0, None))
+        self.assertEqual(lg.place_cells(cells, 22, 38, shape),
+                         {(9, 18), (10, 19), (11, 17), (11, 18), (11, 19)})
+        life = lg.SparseEngine(random_field(9, 13, 5))
+        life.advance(3)
+        life.save(self.path('life.chk'))
+        args = lg.create_parser().parse_args(
+            ['--restore', self.path('life.chk')])
+        cells, generation, shape, _ = lg.start_cells(args, screen=True)
+        self.assertEqual((generation, shape), (3, (9, 13)))
+        self.assertEqual(lg.place_cells(cells, 11, 17, shape),
+                         {(line + 1, pos + 2) for line, pos in life.cells})
+
+
+class FakeScreen:
+    """Stand-in for a curses window that records addstr calls."""
+
+    def __init__(self, keys=()):
+        self.calls = []
+        self.keys = list(keys)
+
+    def addstr(self, line, column, text, attr=0):
+        self.calls.append((line, column, text))
+
+    def getch(self):
+        return self.keys.pop(0) if self.keys else -1
+
+    def getkey(self):
+        return self.keys.pop(0)
+
+    def getmaxyx(self):
+        return 6, 12
+
+    def clear(self):
+        pass
+
+    def nodelay(self, flag):
+        pass
+
+    def refresh(self):
+        pass
+
+
+class TestFieldRenderer(unittest.TestCase):
+
+    def setUp(self):
+        self.color_pair = lg.curses.color_pair
+        lg.curses.color_pair = lambda pair: pair
+
+    def tearDown(self):
+        lg.curses.color_pair = self.color_pair
+
+    def test_full_then_diff(self):
+        screen = FakeScreen()
+        renderer = lg.FieldRenderer(screen)
+        field = [[0, 0, 1, 1],
+                 [0, 0, 0, 0]]
+        self.assertEqual(renderer.draw(field), 8)
+        self.assertEqual(renderer.calls, 3)
+        self.assertEqual(renderer.draw(field), 0)
+        self.assertEqual(renderer.calls, 0)
+        field[1][1] = field[1][2] = 1
+        self.assertEqual(renderer.draw(field), 2)
+        self.assertEqual(screen.calls[-1], (2, 4, '    '))
+
+    def test_invalidate(self):
+        renderer = lg.FieldRenderer(FakeScreen())
+        field = [[0, 1], [1, 0]]
+        renderer.draw(field)
+        renderer.invalidate(1, 1)
+        renderer.invalidate(5, 5)
+        self.assertEqual(renderer.draw(field), 1)
+
+    def test_cursor_cleared_on_start(self):
+        screen = FakeScreen(['KEY_DOWN', 'KEY_RIGHT', 's'])
+        renderer = lg.FieldRenderer(screen)
+        field = lg.init(screen, renderer)
+        screen.calls = []
+        self.assertEqual(renderer.draw(field), 1)
+        self.assertEqual(screen.calls, [(1, 2, '  ')])
+
+    def test_autorun_stops_on_cycle(self):
+        screen = FakeScreen()
+        life = lg.SparseEngine([[0, 0, 0], [1, 1, 1], [0, 0, 0]])
+        period = lg.autorun(screen, life, lg.FieldRenderer(screen), 0, 200)
+        self.assertEqual(period, 2)
+        self.assertEqual(life.generation, 2)
+
+    def test_autorun_quit_and_dead_field(self):
+        screen = FakeScreen([ord('p'), ord('q')])
+        life = lg.NumpyEngine(random_field(20, 20, 1)) if lg.np else \
+            lg.Engine(random_field(20, 20, 1))
+        self.assertIsNone(lg.autorun(screen, life, lg.FieldRenderer(screen),
+                                     1000, 200))
+        life = lg.Engine([[1, 0], [0, 0]])
+        self.assertIsNone(lg.autorun(screen, life, lg.FieldRenderer(screen)))
+        self.assertFalse(life.is_live())
+
+    def test_autorun_quits_promptly_at_low_rate(self):
+        screen = FakeScreen([-1]*10 + [ord('q')])
+        life = lg.Engine(random_field(20, 20, 1))
+        start = perf_counter()
+        lg.autorun(screen, life, lg.FieldRenderer(screen), 0.2, 200)
+        self.assertLess(perf_counter() - start, 1)
+        self.assertEqual(life.generation, 1)
+
+    def test_autorun_reports_engine_error(self):
+        class Broken(lg.Engine):
+            def step(self):
+                raise RuntimeError('broken engine')
+
+        screen = FakeScreen()
+        life = Broken([[0, 1], [1, 0]])
+        with self.assertRaisesRegex(RuntimeError, 'broken engine'):
+            lg.autorun(screen, life, lg.FieldRenderer(screen))
+
+
+if __name__ == '__main__':
+    unittest.main()